@@ -0,0 +1,121 @@
+"""Время сохранения большого дерева курса: ORM по строкам и write_course_trees.
+
+Курс из --sections разделов по --lessons уроков сохраняется прежним
+способом (объект на строку, flush после каждого раздела и урока, связь
+через relationship) и массовой записью write_course_trees. Запуск идет
+на отдельной базе во временной директории.
+
+    python bench/course_bulk_insert.py [--sections 50] [--lessons 40] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["DATABASE_PATH"] = str(Path(tempfile.mkdtemp()) / "bench.db")
+
+import main  # noqa: E402,F401  Создает таблицы во временной базе
+from database import SessionLocal  # noqa: E402
+from models.course import Course, CourseInfo, Lesson, Section  # noqa: E402
+from services.course import write_course_trees  # noqa: E402
+
+
+def course_tree(sections: int, lessons: int):
+    return {
+        "id": str(uuid.uuid4()),
+        "title": "Бенчмарк",
+        "subtitle": "",
+        "type": "",
+        "timetoendL": "",
+        "color": "",
+        "icon": "",
+        "icontype": "",
+        "titleForCourse": "Бенчмарк",
+        "info": [{"id": str(uuid.uuid4()), "title": "О курсе", "subtitle": ""}],
+        "sections": [
+            {
+                "id": str(uuid.uuid4()),
+                "name": f"Раздел {s}",
+                "content": [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "name": f"Урок {l}",
+                        "passing": "no",
+                        "description": "Текст урока " * 50,
+                    }
+                    for l in range(lessons)
+                ],
+            }
+            for s in range(sections)
+        ],
+    }
+
+
+def save_orm(db, course: dict):
+    """Прежнее сохранение разобранного курса через ORM"""
+    db_course = Course(
+        **{
+            key: value
+            for key, value in course.items()
+            if key not in ("info", "sections")
+        }
+    )
+    db.add(db_course)
+    db.flush()
+
+    for info_item in course["info"]:
+        db.add(CourseInfo(**info_item, course_id=db_course.id))
+
+    for section_data in course["sections"]:
+        db_section = Section(
+            id=section_data["id"], name=section_data["name"], course_id=db_course.id
+        )
+        db.add(db_section)
+        db.flush()
+        for content_item in section_data["content"]:
+            db_lesson = Lesson(**content_item)
+            db.add(db_lesson)
+            db.flush()
+            db_section.content.append(db_lesson)
+
+    db.commit()
+
+
+def measure(save, sections: int, lessons: int, repeat: int):
+    best = None
+    for _ in range(repeat):
+        course = course_tree(sections, lessons)
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            save(db, course)
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=50)
+    parser.add_argument("--lessons", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Курс: {args.sections} разделов x {args.lessons} уроков")
+    for name, save in (
+        ("ORM по строкам", save_orm),
+        ("write_course_trees", lambda db, course: write_course_trees(db, [course])),
+    ):
+        best = measure(save, args.sections, args.lessons, args.repeat)
+        print(f"{name}: {best:.3f} с (лучшее из {args.repeat})")
+
+
+if __name__ == "__main__":
+    run()
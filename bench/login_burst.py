@@ -0,0 +1,106 @@
+"""Задержка чтения каталога во время всплеска входов.
+
+--logins одновременных запросов POST /api/auth/token (bcrypt) идут вместе
+с непрерывными GET /api/courses/; печатаются задержки чтения каталога.
+С --inline bcrypt выполняется прямо в цикле событий, как до выноса
+хеширования в пул потоков. Запуск идет на отдельной базе во временной
+директории, приложение вызывается в процессе через ASGI.
+
+    python bench/login_burst.py [--logins 100] [--inline]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["DATABASE_PATH"] = str(Path(tempfile.mkdtemp()) / "bench.db")
+
+import httpx  # noqa: E402
+
+from database import SessionLocal  # noqa: E402
+from main import app  # noqa: E402
+from models.user import User  # noqa: E402
+from services import auth  # noqa: E402
+
+LOGIN = "bench"
+PASSWORD = "bench-password"
+
+
+def create_user():
+    db = SessionLocal()
+    try:
+        db.add(
+            User(
+                login=LOGIN,
+                email="bench@example.com",
+                password=auth.get_password_hash(PASSWORD),
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def burst(logins: int):
+    # Ошибки приложения (например, таймаут пула соединений) считаются
+    # неудачными чтениями, а не прерывают замер
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        # Первый запрос заполняет кеш каталога
+        await client.get("/api/courses/")
+
+        async def login():
+            response = await client.post(
+                "/api/auth/token", data={"username": LOGIN, "password": PASSWORD}
+            )
+            return response.status_code == 200
+
+        latencies, errors = [], 0
+        logins_task = asyncio.gather(*(login() for _ in range(logins)))
+        started = time.perf_counter()
+        while not logins_task.done():
+            request_started = time.perf_counter()
+            response = await client.get("/api/courses/")
+            latencies.append(time.perf_counter() - request_started)
+            if response.status_code != 200:
+                errors += 1
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        logged_in = sum(await logins_task)
+        return elapsed, logged_in, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--inline", action="store_true")
+    args = parser.parse_args()
+
+    if args.inline:
+
+        async def run_inline(func, *func_args):
+            return func(*func_args)
+
+        auth._run_in_hash_pool = run_inline
+
+    create_user()
+    elapsed, logged_in, latencies, errors = asyncio.run(burst(args.logins))
+    latencies.sort()
+    mode = "в цикле событий" if args.inline else "в пуле потоков"
+    print(f"{args.logins} входов, bcrypt {mode}: {elapsed:.2f} с, успешных {logged_in}")
+    print(f"Чтений каталога: {len(latencies)}, с ошибкой: {errors}")
+    print(f"Задержка p50: {statistics.median(latencies) * 1000:.1f} мс")
+    print(f"Задержка p99: {latencies[int(len(latencies) * 0.99)] * 1000:.1f} мс")
+    print(f"Задержка max: {latencies[-1] * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
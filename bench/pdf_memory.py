@@ -0,0 +1,198 @@
+"""Пиковая память потокового разбора PDF (CourseOutlineParser).
+
+Синтетический документ из --pages страниц подается в парсер порциями по
+PDF_PAGES_PER_CHUNK страниц, как при импорте. Для сравнения тот же текст
+разбирается прежним способом (baseline_parse): тексты всех страниц
+собираются в список, склеиваются в full_text, заголовки ищутся
+re.findall/re.finditer по всему тексту, а текст уроков вырезается срезами.
+
+    python bench/pdf_memory.py [--pages 1000] [--pdf путь/к/файлу.pdf]
+
+С --pdf вместо синтетики разбирается текст реального файла.
+"""
+
+import argparse
+import re
+import sys
+import tracemalloc
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import settings  # noqa: E402
+from services.pdf_processor import (  # noqa: E402
+    CourseOutlineParser,
+    count_pages,
+    extract_pages,
+    split_page_ranges,
+)
+
+# Паттерны прежнего разбора по полному тексту
+BASELINE_MAIN_SECTION = r"^\s*(\d{1,3})[\.\-]?\s+([А-ЯЁA-Z\s]+(?:[А-ЯЁA-Z0-9\s\-]+)*)$"
+BASELINE_SUB_SECTION = r"^\s*(\d+(?:\.\d+)+)[\.\-]?\s+(.+)$"
+
+LINES_PER_PAGE = 50
+SUBSECTIONS_PER_SECTION = 8
+PAGES_PER_SUBSECTION = 5
+
+
+def synthetic_chunks(pages: int, chunk_size: int):
+    """Порции текста страниц: раздел на каждые 40 страниц, подраздел на 5"""
+    section = subsection = 0
+    chunk = []
+    for page in range(pages):
+        lines = []
+        if page % PAGES_PER_SUBSECTION == 0:
+            if subsection % SUBSECTIONS_PER_SECTION == 0:
+                section += 1
+                lines.append(f"{section}. РАЗДЕЛ НОМЕР {section}")
+            subsection += 1
+            lines.append(f"{section}.{subsection} ПОДРАЗДЕЛ {subsection}")
+        while len(lines) < LINES_PER_PAGE:
+            lines.append(
+                f"Страница {page + 1}, строка {len(lines)}: текст урока о "
+                "переменных, циклах и функциях с примерами кода и пояснениями."
+            )
+        chunk.append("\n".join(lines))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def baseline_parse(page_texts: list):
+    """Прежний разбор: регулярные выражения по склеенному тексту документа.
+
+    Повторяет parse_course_text до перехода на CourseOutlineParser, без
+    отладочной печати. Возвращает разделы с уроками в том же виде.
+    """
+    full_text = "\n".join(page_texts)
+    main_sections = re.findall(BASELINE_MAIN_SECTION, full_text, re.MULTILINE)
+    sub_section_matches = list(
+        re.finditer(BASELINE_SUB_SECTION, full_text, re.MULTILINE)
+    )
+
+    unique_sections = {}
+    for num, title in main_sections:
+        title = title.strip()
+        if len(title.replace(" ", "")) > 2:
+            unique_sections[num] = {
+                "id": f"section_{uuid.uuid4().hex}",
+                "title": title,
+                "subsections": [],
+            }
+
+    for i, match in enumerate(sub_section_matches):
+        num = match.group(1)
+        title = match.group(2).strip()
+        if title != title.upper():
+            continue
+        start_idx = match.start()
+        end_idx = (
+            sub_section_matches[i + 1].start()
+            if i + 1 < len(sub_section_matches)
+            else len(full_text)
+        )
+        section_text = full_text[start_idx:end_idx].strip()
+        main_section_num = num.split(".")[0]
+        if main_section_num in unique_sections:
+            unique_sections[main_section_num]["subsections"].append(
+                {"num": num, "title": title, "text": section_text}
+            )
+
+    sections = []
+    for _, sec in sorted(unique_sections.items(), key=lambda x: int(x[0])):
+        sec["subsections"].sort(key=lambda x: list(map(int, x["num"].split("."))))
+        sections.append(
+            {
+                "id": sec["id"],
+                "name": sec["title"],
+                "content": [
+                    {
+                        "id": uuid.uuid4().hex,
+                        "name": subsection["title"],
+                        "passing": "no",
+                        "description": subsection["text"],
+                    }
+                    for subsection in sec["subsections"]
+                ],
+            }
+        )
+    return {"sections": sections}
+
+
+def lesson_outline(result: dict):
+    """Структура курса без ID: названия разделов, уроков и их тексты"""
+    return [
+        (
+            section["name"],
+            [(lesson["name"], lesson["description"]) for lesson in section["content"]],
+        )
+        for section in result["sections"]
+    ]
+
+
+def pdf_chunks(path: str, chunk_size: int):
+    backend = settings.PDF_BACKEND
+    for start, end in split_page_ranges(count_pages(backend, path), chunk_size):
+        yield extract_pages(backend, path, start, end)
+
+
+def measure(run):
+    tracemalloc.start()
+    try:
+        result = run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--pdf", help="разобрать реальный PDF вместо синтетики")
+    args = parser.parse_args()
+
+    def chunks():
+        if args.pdf:
+            return pdf_chunks(args.pdf, settings.PDF_PAGES_PER_CHUNK)
+        return synthetic_chunks(args.pages, settings.PDF_PAGES_PER_CHUNK)
+
+    def streaming():
+        outline = CourseOutlineParser()
+        for chunk in chunks():
+            outline.feed_pages(chunk)
+        return outline.finish("Бенчмарк")
+
+    def baseline():
+        # Прежний импорт собирал тексты всех страниц до начала разбора
+        return baseline_parse([page for chunk in chunks() for page in chunk])
+
+    baseline_result, baseline_peak = measure(baseline)
+    baseline_outline = lesson_outline(baseline_result)
+    del baseline_result
+    result, streaming_peak = measure(streaming)
+    if lesson_outline(result) != baseline_outline:
+        print("Внимание: результаты прежнего и потокового разбора различаются")
+    del baseline_outline
+    text_size = sum(len(page.encode()) + 1 for chunk in chunks() for page in chunk)
+
+    lessons = sum(len(section["content"]) for section in result["sections"])
+    lesson_text = sum(
+        len(lesson["description"].encode())
+        for section in result["sections"]
+        for lesson in section["content"]
+    )
+    mb = 1024 * 1024
+    print(f"Текст документа: {text_size / mb:.1f} МБ")
+    print(f"Разделов: {len(result['sections'])}, уроков: {lessons}")
+    print(f"Текст уроков в результате: {lesson_text / mb:.1f} МБ")
+    print(f"Пик памяти, прежний разбор по full_text: {baseline_peak / mb:.1f} МБ")
+    print(f"Пик памяти, потоковый разбор: {streaming_peak / mb:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Пропускная способность SQLite с профилями PRAGMA "default" и "tuned".
+
+Для каждого профиля создается отдельная база во временной директории,
+заполняется --lessons уроками, и --readers потоков читают уроки по ID,
+пока --writers потоков обновляют их, по транзакции на запись. Печатается
+число чтений, записей и ошибок "database is locked" за --seconds секунд.
+Каждый профиль измеряется в отдельном процессе, потому что профиль
+читается из настроек при импорте database.
+
+    python bench/sqlite_pragmas.py [--seconds 5] [--readers 4] [--writers 2]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PROFILES = ("default", "tuned")
+
+
+def worker(args):
+    sys.path.insert(0, str(ROOT))
+    from sqlalchemy import insert, select, update
+    from sqlalchemy.exc import OperationalError
+
+    from database import engine
+    from models.course import Lesson
+
+    Lesson.__table__.create(bind=engine)
+    lesson_ids = [f"lesson-{number}" for number in range(args.lessons)]
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Lesson.__table__),
+            [
+                {"id": lesson_id, "name": lesson_id, "passing": "no"}
+                for lesson_id in lesson_ids
+            ],
+        )
+
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+
+    def run(operation):
+        done = locked = 0
+        while time.monotonic() < deadline:
+            try:
+                with engine.begin() as conn:
+                    operation(conn, random.choice(lesson_ids))
+                done += 1
+            except OperationalError as e:
+                if "database is locked" not in str(e):
+                    raise
+                locked += 1
+        with lock:
+            counts["reads" if operation is read else "writes"] += done
+            counts["locked"] += locked
+
+    def read(conn, lesson_id):
+        conn.execute(
+            select(Lesson.__table__).where(Lesson.__table__.c.id == lesson_id)
+        ).one()
+
+    def write(conn, lesson_id):
+        conn.execute(
+            update(Lesson.__table__)
+            .where(Lesson.__table__.c.id == lesson_id)
+            .values(name=f"{lesson_id}-{time.monotonic()}")
+        )
+
+    threads = [threading.Thread(target=run, args=(read,)) for _ in range(args.readers)]
+    threads += [
+        threading.Thread(target=run, args=(write,)) for _ in range(args.writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps(counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--lessons", type=int, default=10000)
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        worker(args)
+        return
+
+    for profile in PROFILES:
+        env = {
+            **os.environ,
+            "SQLITE_PRAGMA_PROFILE": profile,
+            "DATABASE_PATH": str(Path(tempfile.mkdtemp()) / "bench.db"),
+        }
+        output = subprocess.run(
+            [sys.executable, __file__, "--profile", profile, *sys.argv[1:]],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        counts = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{profile}: чтений {counts['reads']}, записей {counts['writes']}, "
+            f"database is locked {counts['locked']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
-from pydantic import BaseSettings
+from typing import Literal
+from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
@@ -10,15 +11,51 @@ class Settings(BaseSettings):
     DEBUG: bool = True
     # Настройки базы данных
     DATABASE_URL: str = "sqlite:///./db/college.db"
+    DB_POOL_SIZE: int = 5  # Постоянных соединений в пуле
+    DB_MAX_OVERFLOW: int = 10  # Дополнительных соединений при пиковой нагрузке
+    DB_POOL_TIMEOUT: int = 30  # Ожидание свободного соединения, секунд
+    SQLITE_PRAGMA_PROFILE: Literal["tuned", "default"] = "tuned"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # Байт файла БД, читаемых через mmap
+    SQLITE_CACHE_SIZE: int = -64000  # Отрицательное значение - размер в КиБ
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # Ожидание блокировки записи
+
+    # Настройки запуска сервера (python main.py)
+    SERVER_HOST: str = "127.0.0.1"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0  # Процессов-обработчиков, 0 - по числу ядер
+    CACHE_SYNC_INTERVAL_SECONDS: float = 1.0  # Опрос поколений общих кешей
+    CATALOG_CACHE_SIZE: int = 1000  # Максимум закешированных деревьев курсов
+    PAGE_DEFAULT_LIMIT: int = 100  # Записей на странице списков по умолчанию
+    PAGE_MAX_LIMIT: int = 1000  # Максимальный limit для списков
+    CATALOG_EXPORT_BATCH: int = 100  # Курсов в одном пакете выгрузки каталога
+    CATALOG_IMPORT_BATCH_ROWS: int = 5000  # Курсов и уроков в пакете импорта
+    PROGRESS_BATCH_MAX: int = 500  # Отметок о прохождении в одном коммите
 
     # Пути к директориям
     BASE_DIR: Path = Path(__file__).resolve().parent
     COURSE_IMG_DIR: Path = BASE_DIR / "CourseImg"
+    DATABASE_PATH: Path = BASE_DIR / "db" / "college.db"  # Файл базы SQLite
 
     # Настройки для JWT
     SECRET_KEY: str = "your-secret-key-for-jwt"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PASSWORD_HASH_WORKERS: int = 2  # Потоков для bcrypt (вход и регистрация)
+    AUTH_CACHE_SIZE: int = 10000  # Максимум закешированных токенов
+    AUTH_CACHE_TTL_SECONDS: int = 300  # Время жизни записи кеша токенов
+
+    # Настройки отправки почты
+    SMTP_HOST: str = "smtp.gmail.com"
+    SMTP_PORT: int = 587
+    SMTP_STARTTLS: bool = True
+    # Учетные данные задаются только через окружение или .env
+    SMTP_USER: str = ""
+    SMTP_PASSWORD: str = ""  # Пароль приложения
+    EMAIL_SENDER: str = ""  # Адрес отправителя, по умолчанию SMTP_USER
+    EMAIL_BATCH_SIZE: int = 50  # Писем за одно SMTP-соединение
+    EMAIL_MAX_ATTEMPTS: int = 5  # Попыток отправки до статуса failed
+    EMAIL_RETRY_SECONDS: int = 30  # Базовая задержка повтора (удваивается)
+    EMAIL_POLL_SECONDS: int = 10  # Интервал проверки очереди
 
     # CORS настройки
     CORS_ORIGINS: list = [
@@ -35,7 +72,12 @@ class Settings(BaseSettings):
     ]
 
     # Настройки загрузки файлов
-    MAX_UPLOAD_SIZE: 0  # 10 MB
+    MAX_UPLOAD_SIZE: int = 256 * 1024 * 1024  # Лимит тела запроса, 0 - без лимита
+    UPLOAD_SPOOL_DIR: Path = BASE_DIR / "tmp" / "uploads"  # Временные файлы загрузок
+    RESUMABLE_UPLOAD_DIR: Path = BASE_DIR / "tmp" / "resumable"  # Сессии загрузок
+    RESUMABLE_CHUNK_SIZE: int = 8 * 1024 * 1024  # Размер части по умолчанию
+    RESUMABLE_MAX_SIZE: int = 4 * 1024 * 1024 * 1024  # Лимит файла по частям
+    RESUMABLE_TTL_SECONDS: int = 24 * 3600  # Время хранения незавершенных сессий
     ALLOWED_IMAGE_TYPES: list = [
         "image/jpeg",
         "image/png",
@@ -43,9 +85,30 @@ class Settings(BaseSettings):
         "image/svg+xml",
     ]
 
+    # Настройки обработки изображений (иконки курсов, аватары)
+    IMAGE_WORKERS: int = 2  # Процессов для декодирования и сжатия изображений
+    IMAGE_MAX_PIXELS: int = 40_000_000  # Больше пикселей - отказ (защита от бомб)
+    IMAGE_VARIANT_WIDTHS: list = [160, 320, 640, 1280]  # Ширины вариантов
+    IMAGE_DEFAULT_WIDTH: int = 640  # Ширина варианта, сохраняемого в icon/img
+    IMAGE_WEBP_QUALITY: int = 80
+    IMAGE_JPEG_QUALITY: int = 82
+    MEDIA_DIR: Path = BASE_DIR / "media"  # Хранилище файлов по SHA-256 содержимого
+
+    # Настройки обработки PDF
+    PDF_WORKERS: int = 2  # Количество процессов для разбора PDF
+    PDF_QUEUE_SIZE: int = 8  # Максимум задач в очереди и в работе
+    PDF_JOB_TTL_SECONDS: int = 3600  # Время хранения результатов задач
+    PDF_JOBS_DIR: Path = BASE_DIR / "tmp" / "pdf_jobs"  # Общие для процессов статусы
+    PDF_COMMIT_CLAIM_TIMEOUT_SECONDS: int = 120  # Срок отметки о сохранении курса
+    PDF_BACKEND: str = "pdfplumber"  # Движок извлечения текста по умолчанию
+    PDF_PAGES_PER_CHUNK: int = 50  # Страниц в одной параллельной задаче
+    PDF_CACHE_DIR: Path = BASE_DIR / "cache" / "pdf"
+    PDF_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # Лимит размера кеша разбора
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
+        extra = "ignore"
 
 
 # Создаем экземпляр настроек
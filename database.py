@@ -1,9 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from pathlib import Path
 
+from config import settings
+
 # Создаем директорию для базы данных, если она не существует
 BASE_DIR = Path(__file__).resolve().parent
 DB_DIR = BASE_DIR / "db"
@@ -14,16 +17,64 @@ COURSE_IMG_DIR = BASE_DIR / "CourseImg"
 COURSE_IMG_DIR.mkdir(exist_ok=True)
 
 # URL для подключения к SQLite DB
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_DIR}/college.db"
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{settings.DATABASE_PATH}"
+# Тот же файл через асинхронный драйвер aiosqlite
+ASYNC_SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{settings.DATABASE_PATH}"
 
 # Создание движка SQLAlchemy
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+)
+
+# Асинхронный движок: запросы из async-обработчиков не блокируют цикл событий
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
 )
 
+# Профили PRAGMA, применяемые к каждому новому соединению SQLite.
+# "tuned": WAL позволяет читать во время записи, synchronous=NORMAL в режиме
+# WAL безопасен и убирает fsync на каждый commit, busy_timeout заставляет
+# писателей ждать блокировку вместо немедленной ошибки "database is locked".
+SQLITE_PRAGMA_PROFILES = {
+    "default": {},
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "temp_store": "MEMORY",
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+    },
+}
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    pragmas = SQLITE_PRAGMA_PROFILES[settings.SQLITE_PRAGMA_PROFILE]
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+event.listen(engine, "connect", _apply_sqlite_pragmas)
+event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
 # Создание сессии для соединения с базой данных
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронные сессии. expire_on_commit=False, чтобы после commit объекты
+# можно было сериализовать в ответ без повторной загрузки из базы
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
+)
+
 # Базовый класс для всех моделей
 Base = declarative_base()
 
@@ -35,3 +86,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Зависимость для получения асинхронной сессии базы данных
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
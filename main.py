@@ -2,26 +2,108 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pathlib import Path
 import os
-from starlette.middleware.base import BaseHTTPMiddleware  # Добавлен импорт
 
+from config import settings
 from database import engine, Base
-from routers import course, user, auth, pdf_processor
+from routers import course, user, auth, pdf_processor, search, uploads
 from models.course import Base as CourseBase
-
-
-# Создаем класс промежуточного ПО для отключения ограничения размера файла
-class LimitUploadSize(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Отключаем проверку размера файла
-        request.state.max_upload_size = None
-        return await call_next(request)
+from services.auth import password_hash_pool_stats
+from services.cache_sync import start_cache_sync, stop_cache_sync
+from services.catalog_cache import catalog_cache_stats
+from services.email_outbox import start_email_sender, stop_email_sender
+from services.images import shutdown_image_executor
+from services.media import MEDIA_DIR, collect_garbage
+from services.pdf_jobs import shutdown_executor
+from services.progress import start_progress_writer, stop_progress_writer
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+# Промежуточное ПО, ограничивающее размер тела запроса прямо во время приема.
+# Тело не буферизуется: считаются только байты, пришедшие от клиента, и как
+# только лимит превышен, прием прекращается и клиент получает 413.
+class LimitUploadSize:
+    def __init__(self, app, max_upload_size: int):
+        self.app = app
+        self.max_upload_size = max_upload_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_upload_size:
+            await self.app(scope, receive, send)
+            return
+
+        too_large = JSONResponse(
+            status_code=413,
+            content={"detail": "Размер загружаемого файла слишком велик"},
+        )
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length:
+            try:
+                content_length = int(content_length)
+            except ValueError:
+                bad_request = JSONResponse(
+                    status_code=400,
+                    content={"detail": "Некорректный заголовок Content-Length"},
+                )
+                await bad_request(scope, receive, send)
+                return
+            if content_length > self.max_upload_size:
+                await too_large(scope, receive, send)
+                return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_upload_size:
+                    exceeded = True
+                    raise UploadTooLargeError()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            # После превышения лимита ответ приложения заменяется на 413
+            if exceeded and not response_started:
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+
+        if exceeded and not response_started:
+            await too_large(scope, receive, send)
+
+
+# Файлы хранилища медиа адресуются хешем содержимого и никогда не меняются
+class ImmutableStaticFiles(StaticFiles):
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
 
 
 # Создаем таблицы в базе данных
 CourseBase.metadata.create_all(bind=engine)
 
+# create_all не добавляет новые индексы в уже существующие таблицы
+for table in CourseBase.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
 # Создаем FastAPI приложение один раз
 app = FastAPI(
     title="Онлайн-колледж API",
@@ -48,16 +130,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Заголовки кеширования и пагинации, доступные фронтенду
+    expose_headers=["ETag", "Last-Modified", "Link", "X-Next-Cursor"],
 )
 
-# Добавляем middleware для отключения ограничения размера файлов
-app.add_middleware(LimitUploadSize)
+# Ограничиваем размер загружаемых файлов (MAX_UPLOAD_SIZE, 0 - без лимита)
+app.add_middleware(LimitUploadSize, max_upload_size=settings.MAX_UPLOAD_SIZE)
 
 # Регистрация маршрутов
 app.include_router(auth.router)
 app.include_router(course.router)
 app.include_router(user.router)
 app.include_router(pdf_processor.router)
+app.include_router(search.router)
+app.include_router(uploads.router)
 
 # Настройка статических файлов
 BASE_DIR = Path(__file__).resolve().parent
@@ -76,6 +162,27 @@ app.mount(
     "/UsersAvatar", StaticFiles(directory=str(USERS_AVATAR_DIR)), name="user_avatars"
 )
 
+# Монтирование хранилища медиа (иконки курсов и аватары)
+app.mount("/media", ImmutableStaticFiles(directory=str(MEDIA_DIR)), name="media")
+
+
+@app.on_event("startup")
+async def start_background_workers():
+    await start_cache_sync()
+    # Файлы хранилища медиа, ссылки на которые пропали до перезапуска
+    await run_in_threadpool(collect_garbage)
+    start_email_sender()
+    start_progress_writer()
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await stop_progress_writer()
+    await stop_email_sender()
+    await stop_cache_sync()
+    shutdown_executor()
+    shutdown_image_executor()
+
 
 @app.get("/")
 def read_root():
@@ -87,6 +194,14 @@ def health_check():
     return {"status": "ok", "message": "API работает корректно"}
 
 
+@app.get("/api/metrics")
+def metrics():
+    return {
+        "password_hash_pool": password_hash_pool_stats(),
+        "catalog_cache": catalog_cache_stats(),
+    }
+
+
 # Обработчик исключений
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -96,20 +211,23 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 
 # Для запуска приложения используйте:
-# uvicorn main:app --reload --port 8000 --limit-upload 0
+# python main.py  (SERVER_WORKERS процессов на общем сокете)
+# uvicorn main:app --reload --port 8000  (для разработки)
 
 if __name__ == "__main__":
     import uvicorn
 
+    # Процессы-обработчики принимают соединения с одного сокета, который
+    # открывает родительский процесс. Кеши в памяти у каждого свои и
+    # согласуются через services.cache_sync. uvloop и httptools
+    # используются, если установлены (loop="auto", http="auto").
     uvicorn.run(
-        app,
-        port=8000,
+        "main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=settings.SERVER_WORKERS or os.cpu_count() or 1,
+        loop="auto",
+        http="auto",
         limit_concurrency=100,
-        limit_max_requests=0,
         timeout_keep_alive=120,
-        # Важные параметры для больших файлов:
-        http="h11",
-        loop="asyncio",
-        # Размер в байтах (0 для отключения ограничения)
-        limit_upload=0,
     )
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String
+from database import Base
+
+
+class CacheGeneration(Base):
+    __tablename__ = "cache_generations"
+
+    # Имя кеша и номер его поколения, растущий при каждом изменении данных
+    name = Column(String, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
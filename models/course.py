@@ -1,5 +1,14 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    String,
+    Text,
+    ForeignKey,
+    Index,
+    Table,
+)
+from sqlalchemy.orm import deferred, relationship
 from database import Base
 
 # Связь многие-ко-многим между разделами и уроками
@@ -13,6 +22,8 @@ lesson_section = Table(
 
 class Course(Base):
     __tablename__ = "courses"
+    # Порядок каталога и ключ курсорной пагинации
+    __table_args__ = (Index("ix_courses_title_id", "title", "id"),)
 
     id = Column(String, primary_key=True, index=True)
     title = Column(String, index=True)
@@ -67,8 +78,21 @@ class Lesson(Base):
     id = Column(String, primary_key=True, index=True)
     name = Column(String)
     passing = Column(String)
-    description = Column(Text, nullable=True)
+    # Полный текст урока (у импортированных из PDF - текст подраздела)
+    # загружается только по запросу
+    description = deferred(Column(Text, nullable=True))
 
     sections = relationship(
         "Section", secondary=lesson_section, back_populates="content"
     )
+
+
+class CourseVersion(Base):
+    __tablename__ = "course_versions"
+
+    # Номер версии дерева курса, растущий при каждом изменении курса, его
+    # info, разделов и уроков. Запись не удаляется вместе с курсом, чтобы
+    # версии курса, созданного заново с тем же ID, не повторялись.
+    course_id = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
@@ -0,0 +1,134 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, event, text
+from database import Base
+
+
+class ImageVariant(Base):
+    __tablename__ = "image_variants"
+    __table_args__ = (Index("ix_image_variants_owner", "owner_type", "owner_id"),)
+
+    # Вариант изображения (иконки курса или аватара пользователя) одной
+    # ширины и формата. Клиент выбирает наименьший подходящий вариант.
+    id = Column(Integer, primary_key=True)
+    owner_type = Column(String, nullable=False)  # course или user
+    owner_id = Column(String, nullable=False)
+    width = Column(Integer, nullable=True)  # None - векторное изображение
+    height = Column(Integer, nullable=True)
+    format = Column(String, nullable=False)  # webp, jpeg или svg
+    url = Column(String, nullable=False)
+    # Файл варианта в хранилище медиа (models.media.MediaBlob)
+    sha256 = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+
+
+class MediaBlob(Base):
+    __tablename__ = "media_blobs"
+    __table_args__ = (
+        Index("ix_media_blobs_ref_count", "ref_count"),
+        Index("ix_media_blobs_url", "url"),
+    )
+
+    # Файл хранилища медиа, адресуемый SHA-256 содержимого. ref_count -
+    # число вариантов изображений (image_variants), иконок курсов
+    # (courses.icon) и аватаров (users.img), ссылающихся на файл;
+    # поддерживается триггерами, файлы без ссылок удаляет сборщик мусора
+    sha256 = Column(String, primary_key=True)
+    url = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Счетчики ссылок меняются в той же транзакции, что и варианты изображений,
+# при любом способе изменения image_variants (ORM, Core, массовое удаление)
+_REF_COUNT_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS image_variants_media_ai
+    AFTER INSERT ON image_variants
+    BEGIN
+        INSERT INTO media_blobs (sha256, url, size, ref_count, created_at)
+        VALUES (new.sha256, new.url, new.size, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (sha256) DO UPDATE SET ref_count = ref_count + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS image_variants_media_ad
+    AFTER DELETE ON image_variants
+    BEGIN
+        UPDATE media_blobs SET ref_count = ref_count - 1
+        WHERE sha256 = old.sha256;
+    END""",
+)
+
+# Иконка курса и аватар пользователя тоже ссылаются на файлы хранилища: URL
+# можно записать и без загрузки (PUT курса или пользователя, импорт), в том
+# числе URL чужого варианта. URL сравнивается без ведущего "/", ссылки на
+# файлы, которых нет в хранилище, не учитываются.
+_COLUMN_REF_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS courses_icon_media_ai
+    AFTER INSERT ON courses
+    BEGIN
+        UPDATE media_blobs SET ref_count = ref_count + 1
+        WHERE url = ltrim(new.icon, '/');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS courses_icon_media_ad
+    AFTER DELETE ON courses
+    BEGIN
+        UPDATE media_blobs SET ref_count = ref_count - 1
+        WHERE url = ltrim(old.icon, '/');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS courses_icon_media_au
+    AFTER UPDATE OF icon ON courses
+    WHEN old.icon IS NOT new.icon
+    BEGIN
+        UPDATE media_blobs SET ref_count = ref_count - 1
+        WHERE url = ltrim(old.icon, '/');
+        UPDATE media_blobs SET ref_count = ref_count + 1
+        WHERE url = ltrim(new.icon, '/');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_img_media_ai
+    AFTER INSERT ON users
+    BEGIN
+        UPDATE media_blobs SET ref_count = ref_count + 1
+        WHERE url = ltrim(new.img, '/');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_img_media_ad
+    AFTER DELETE ON users
+    BEGIN
+        UPDATE media_blobs SET ref_count = ref_count - 1
+        WHERE url = ltrim(old.img, '/');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_img_media_au
+    AFTER UPDATE OF img ON users
+    WHEN old.img IS NOT new.img
+    BEGIN
+        UPDATE media_blobs SET ref_count = ref_count - 1
+        WHERE url = ltrim(old.img, '/');
+        UPDATE media_blobs SET ref_count = ref_count + 1
+        WHERE url = ltrim(new.img, '/');
+    END""",
+)
+_COLUMN_REF_TRIGGER_NAMES = {
+    f"{table}_{column}_media_{suffix}"
+    for table, column in (("courses", "icon"), ("users", "img"))
+    for suffix in ("ai", "ad", "au")
+}
+
+# Пересчет всех счетчиков: для баз, созданных до учета иконок и аватаров
+_RECOUNT_REFS = """UPDATE media_blobs SET ref_count =
+    (SELECT count(*) FROM image_variants WHERE sha256 = media_blobs.sha256)
+    + (SELECT count(*) FROM courses WHERE ltrim(icon, '/') = media_blobs.url)
+    + (SELECT count(*) FROM users WHERE ltrim(img, '/') = media_blobs.url)"""
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_ref_count_triggers(target, connection, **kw):
+    existing = set(
+        connection.scalars(
+            text("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        )
+    )
+    for trigger in _REF_COUNT_TRIGGERS + _COLUMN_REF_TRIGGERS:
+        connection.execute(text(trigger))
+    # Триггеры создаются до пересчета, чтобы не пропустить изменения,
+    # сделанные между ними
+    if not existing.issuperset(_COLUMN_REF_TRIGGER_NAMES):
+        connection.execute(text(_RECOUNT_REFS))
@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String
+from database import Base
+
+
+class UserLessonProgress(Base):
+    __tablename__ = "user_lesson_progress"
+    # Первичный ключ (user_id, lesson_id) - индекс "уроки пользователя",
+    # ix_user_lesson_progress_lesson - пересчет счетчиков по урокам курса
+    __table_args__ = (Index("ix_user_lesson_progress_lesson", "lesson_id", "user_id"),)
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    lesson_id = Column(String, ForeignKey("lessons.id"), primary_key=True)
+    completed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserCourseProgress(Base):
+    __tablename__ = "user_course_progress"
+
+    # Число пройденных пользователем уроков курса. Увеличивается при
+    # прохождении урока и пересчитывается при изменении состава курса
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    course_id = Column(String, ForeignKey("courses.id"), primary_key=True)
+    completed_lessons = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CourseStats(Base):
+    __tablename__ = "course_stats"
+
+    # Число уроков курса, пересчитывается при изменении состава уроков курса
+    course_id = Column(String, ForeignKey("courses.id"), primary_key=True)
+    lesson_count = Column(Integer, nullable=False, default=0)
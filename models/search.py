@@ -0,0 +1,95 @@
+from sqlalchemy import Column, Integer, String, UniqueConstraint, event, text
+from database import Base
+
+# Полнотекстовый индекс каталога (SQLite FTS5). search_index хранит
+# заголовок и текст документа, search_documents связывает rowid документа
+# с курсом, разделом или уроком. INTEGER PRIMARY KEY не меняется при VACUUM,
+# поэтому rowid индекса остается стабильным.
+SEARCH_INDEX = "search_index"
+
+# Вид документа: таблица, колонка заголовка, колонка текста
+SEARCH_SOURCES = {
+    "course": ("courses", "title", "subtitle"),
+    "section": ("sections", "name", None),
+    "lesson": ("lessons", "name", "description"),
+}
+
+
+class SearchDocument(Base):
+    __tablename__ = "search_documents"
+    __table_args__ = (UniqueConstraint("kind", "ref_id"),)
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    ref_id = Column(String, nullable=False)
+
+
+def _triggers(kind: str, table: str, title: str, body):
+    doc_id = (
+        f"(SELECT id FROM search_documents WHERE kind = '{kind}' AND ref_id = {{}}.id)"
+    )
+    body_new = f"new.{body}" if body else "NULL"
+    columns = f"{title}, {body}" if body else title
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO search_documents (kind, ref_id) VALUES ('{kind}', new.id);
+            INSERT INTO {SEARCH_INDEX} (rowid, title, body)
+            VALUES ({doc_id.format("new")}, new.{title}, {body_new});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_au
+        AFTER UPDATE OF id, {columns} ON {table}
+        BEGIN
+            UPDATE search_documents SET ref_id = new.id
+            WHERE kind = '{kind}' AND ref_id = old.id;
+            UPDATE {SEARCH_INDEX} SET title = new.{title}, body = {body_new}
+            WHERE rowid = {doc_id.format("new")};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM {SEARCH_INDEX} WHERE rowid = {doc_id.format("old")};
+            DELETE FROM search_documents WHERE kind = '{kind}' AND ref_id = old.id;
+        END""",
+    ]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_search_index(target, connection, **kw):
+    """Создать FTS5-индекс и триггеры, синхронизирующие его с каталогом.
+
+    Триггеры срабатывают и на массовые вставки (импорт каталога, PDF),
+    которые не вызывают событий ORM. При первом создании индекс
+    заполняется уже существующими курсами, разделами и уроками.
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": SEARCH_INDEX}
+    ).first()
+    connection.execute(
+        text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_INDEX} USING fts5("
+            "title, body, tokenize = 'unicode61 remove_diacritics 2', "
+            "prefix = '2 3')"
+        )
+    )
+    for kind, (table, title, body) in SEARCH_SOURCES.items():
+        for trigger in _triggers(kind, table, title, body):
+            connection.execute(text(trigger))
+
+    if exists:
+        return
+    connection.execute(text("DELETE FROM search_documents"))
+    for kind, (table, title, body) in SEARCH_SOURCES.items():
+        connection.execute(
+            text(
+                "INSERT INTO search_documents (kind, ref_id) "
+                f"SELECT '{kind}', id FROM {table}"
+            )
+        )
+        connection.execute(
+            text(
+                f"INSERT INTO {SEARCH_INDEX} (rowid, title, body) "
+                f"SELECT d.id, t.{title}, {f't.{body}' if body else 'NULL'} "
+                f"FROM {table} t JOIN search_documents d "
+                f"ON d.kind = '{kind}' AND d.ref_id = t.id"
+            )
+        )
@@ -1,11 +1,14 @@
 # models/user_course.py
-from sqlalchemy import Column, Integer, String, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, Table
 from database import Base
 
-# Связь многие-ко-многим между пользователями и курсами
+# Связь многие-ко-многим между пользователями и курсами (запись на курс).
+# Первичный ключ (user_id, course_id) - индекс "курсы пользователя",
+# ix_user_courses_course_id - "слушатели курса"
 user_course = Table(
     "user_courses",
     Base.metadata,
     Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
     Column("course_id", String, ForeignKey("courses.id"), primary_key=True),
+    Index("ix_user_courses_course_id", "course_id", "user_id"),
 )
@@ -1,14 +1,15 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_async_db
 from services.auth import (
     authenticate_user,
     create_access_token,
     ACCESS_TOKEN_EXPIRE_MINUTES,
-    get_password_hash,
+    get_password_hash_async,
     get_current_active_user,
 )
 from models.user import User
@@ -23,10 +24,11 @@ router = APIRouter(
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Эндпоинт для получения JWT токена"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
 
     if not user:
         raise HTTPException(
@@ -44,13 +46,15 @@ async def login_for_access_token(
 
 
 @router.post("/register", response_model=UserOut)
-async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(
+    user_data: UserCreate, db: AsyncSession = Depends(get_async_db)
+):
     """Регистрация нового пользователя"""
     # Проверяем, что пользователь с таким логином или email не существует
-    existing_user = (
-        db.query(User)
-        .filter((User.login == user_data.login) | (User.email == user_data.email))
-        .first()
+    existing_user = await db.scalar(
+        select(User).where(
+            (User.login == user_data.login) | (User.email == user_data.email)
+        )
     )
 
     if existing_user:
@@ -59,8 +63,12 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
             detail="Пользователь с таким логином или email уже существует",
         )
 
+    # Завершаем читающую транзакцию: на время bcrypt соединение
+    # возвращается в пул и доступно другим запросам
+    await db.commit()
+
     # Создаем нового пользователя
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     db_user = User(
         login=user_data.login,
         email=user_data.email,
@@ -69,8 +77,8 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     )
 
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     return db_user
 
@@ -6,15 +6,28 @@ from fastapi import (
     File,
     Form,
     Body,
+    Query,
+    Request,
+    Response,
 )
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, undefer
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
+from hashlib import sha1
+from email.utils import format_datetime, parsedate_to_datetime
 import json
 
-from database import get_db
+from config import settings
+from database import get_async_db
 from models.course import Course, CourseInfo, Section, Lesson
 from schemas.course import (
     Course as CourseSchema,
+    CourseSummary,
+    CourseImage,
     CourseCreate,
     CourseUpdate,
     CourseInfo as CourseInfoSchema,
@@ -25,15 +38,39 @@ from schemas.course import (
     LessonCreate,
 )
 from services.course import (
-    get_courses,
-    get_course,
+    CatalogImportError,
+    catalog_projection,
+    catalog_projection_key,
+    get_catalog_page_json,
+    get_course_tree_json,
+    export_catalog_ndjson,
+    import_catalog_ndjson,
     create_course,
     update_course,
     delete_course,
-    save_course_image,
     create_course_info,
     create_course_section,
 )
+from services.course_versions import get_catalog_version, get_course_version
+from services.media import collect_garbage
+from services.pagination import decode_cursor, next_page_headers
+from services.images import (
+    ImageProcessingError,
+    default_variant_url,
+    discard_rendered,
+    get_image_variants,
+    public_variants,
+    publish_image_variants,
+    render_image,
+    replace_image_variants,
+)
+from services.uploads import (
+    UploadSessionError,
+    get_completed_upload,
+    remove_spooled,
+    spool_completed_upload,
+    spool_upload,
+)
 
 router = APIRouter(
     prefix="/api/courses",
@@ -42,90 +79,253 @@ router = APIRouter(
 )
 
 
+def _validators(etag: str, updated_at: datetime):
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if updated_at is not None:
+        headers["Last-Modified"] = format_datetime(
+            updated_at.replace(tzinfo=timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def _not_modified(request: Request, etag: str, updated_at: datetime):
+    """Проверить условные заголовки запроса (If-None-Match, If-Modified-Since)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or updated_at is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # Last-Modified передается с точностью до секунды
+    return updated_at.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+
+# Уроки раздела вместе с отложенным описанием: разделы с уроками
+# возвращаются целиком, а ленивая загрузка в AsyncSession недоступна
+SECTION_CONTENT = selectinload(Section.content).undefer(Lesson.description)
+
+
 # Роуты для курсов
-@router.get("/", response_model=List[CourseSchema])
-async def read_courses(db: Session = Depends(get_db)):
-    """Получить список всех курсов"""
-    return get_courses(db)
+@router.get("/", response_model=List[CourseSummary])
+async def read_courses(
+    request: Request,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Получить страницу списка курсов, упорядоченного по названию.
+
+    По умолчанию возвращаются только поля курсов, без разделов и уроков.
+    include=info,sections,lessons,descriptions добавляет вложенные уровни,
+    fields=title,icon,... ограничивает набор полей курса. Курсор следующей
+    страницы передается в заголовках X-Next-Cursor и Link.
+    """
+    try:
+        include, fields = catalog_projection(include, fields)
+        after = decode_cursor(cursor, 2) if cursor is not None else None
+        if after is not None and not (
+            isinstance(after[0], (str, type(None))) and isinstance(after[1], str)
+        ):
+            raise ValueError("Некорректный курсор")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Версия читается до данных: ответ может оказаться новее ETag, но не старше
+    version, updated_at = await db.run_sync(get_catalog_version)
+    page_key = f"{catalog_projection_key(include, fields)};{cursor};{limit}"
+    page_hash = sha1(page_key.encode()).hexdigest()[:16]
+    headers = _validators(f'"catalog-{version}-{page_hash}"', updated_at)
+    if _not_modified(request, headers["ETag"], updated_at):
+        return Response(status_code=304, headers=headers)
+
+    # JSON каталога берется из кеша и отдается без повторной валидации
+    data, next_cursor = await db.run_sync(
+        get_catalog_page_json, include, fields, after, limit, version
+    )
+    headers.update(next_page_headers(request, next_cursor, limit))
+    return Response(content=data, media_type="application/json", headers=headers)
+
+
+@router.get("/export")
+def export_courses():
+    """Выгрузить весь каталог в NDJSON: по строке с деревом на каждый курс.
+
+    Ответ формируется потоком, пакетами по CATALOG_EXPORT_BATCH курсов.
+    """
+    return StreamingResponse(
+        export_catalog_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="courses.ndjson"'},
+    )
+
+
+@router.post("/import")
+async def import_courses(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Импортировать каталог из NDJSON в формате выгрузки /export.
+
+    Тело читается потоком, курсы записываются пакетами. Пакеты, записанные
+    до ошибки, остаются в базе; их число указывается в сообщении об ошибке.
+    """
+    try:
+        return await import_catalog_ndjson(db, request.stream())
+    except CatalogImportError as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"{e.message}. Импортировано курсов: {e.imported['courses']}, "
+            f"уроков: {e.imported['lessons']}",
+        )
 
 
 @router.get("/{course_id}", response_model=CourseSchema)
-async def read_course(course_id: str, db: Session = Depends(get_db)):
+async def read_course(
+    course_id: str, request: Request, db: AsyncSession = Depends(get_async_db)
+):
     """Получить информацию о конкретном курсе по ID"""
-    db_course = get_course(db, course_id=course_id)
-    if db_course is None:
+    version, updated_at = await db.run_sync(get_course_version, course_id)
+    headers = _validators(f'"{course_id}-{version}"', updated_at)
+    if _not_modified(request, headers["ETag"], updated_at):
+        return Response(status_code=304, headers=headers)
+
+    data = await db.run_sync(get_course_tree_json, course_id, version)
+    if data is None:
         raise HTTPException(status_code=404, detail="Курс не найден")
-    return db_course
+    return Response(content=data, media_type="application/json", headers=headers)
 
 
 @router.post("/", response_model=CourseSchema)
-async def create_new_course(course: CourseCreate, db: Session = Depends(get_db)):
+async def create_new_course(
+    course: CourseCreate, db: AsyncSession = Depends(get_async_db)
+):
     """Создать новый курс"""
-    return create_course(db=db, course=course)
+    return await db.run_sync(create_course, course)
 
 
 @router.put("/{course_id}", response_model=CourseSchema)
 async def update_existing_course(
-    course_id: str, course: CourseUpdate, db: Session = Depends(get_db)
+    course_id: str, course: CourseUpdate, db: AsyncSession = Depends(get_async_db)
 ):
     """Обновить существующий курс"""
-    return update_course(db=db, course_id=course_id, course=course)
+    return await db.run_sync(update_course, course_id, course)
 
 
 @router.delete("/{course_id}")
-async def delete_existing_course(course_id: str, db: Session = Depends(get_db)):
+async def delete_existing_course(
+    course_id: str, db: AsyncSession = Depends(get_async_db)
+):
     """Удалить курс"""
-    return delete_course(db=db, course_id=course_id)
+    released = await db.run_sync(delete_course, course_id)
+    await run_in_threadpool(collect_garbage, released)
+    return {"detail": f"Курс с ID {course_id} успешно удален"}
 
 
 # Роуты для загрузки изображений
-@router.post("/{course_id}/upload-image")
+@router.post("/{course_id}/upload-image", response_model=CourseImage)
 async def upload_course_image(
-    course_id: str, file: UploadFile = File(...), db: Session = Depends(get_db)
+    course_id: str,
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Загрузить изображение для курса"""
-    db_course = get_course(db, course_id=course_id)
-    if db_course is None:
-        raise HTTPException(status_code=404, detail="Курс не найден")
+    """Загрузить изображение для курса.
 
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="Файл должен быть изображением")
+    Изображение передается файлом или ID завершенной загрузки по частям.
+    Оно уменьшается до нескольких ширин и сохраняется в WebP и JPEG;
+    в icon записывается вариант по умолчанию.
+    """
+    if (file is None) == (upload_id is None):
+        raise HTTPException(status_code=400, detail="Нужно передать файл или upload_id")
 
-    result = await save_course_image(course_id, file)
+    db_course = await db.get(Course, course_id)
+    if db_course is None:
+        raise HTTPException(status_code=404, detail="Курс не найден")
 
-    db_course.icon = result["path"]
-    db.commit()
-    db.refresh(db_course)
+    try:
+        if upload_id is not None:
+            upload = await run_in_threadpool(get_completed_upload, upload_id)
+            content_type = upload["content_type"] or ""
+        else:
+            content_type = file.content_type or ""
+        if not content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="Файл должен быть изображением")
+
+        if upload_id is not None:
+            path, _, _ = await run_in_threadpool(spool_completed_upload, upload_id)
+        else:
+            path, _, _ = await spool_upload(file)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+    try:
+        variants = await render_image(path, content_type)
+    except ImageProcessingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        remove_spooled(path)
+
+    try:
+        released = await db.run_sync(
+            replace_image_variants, "course", course_id, variants
+        )
+        db_course.icon = default_variant_url(variants)
+        await db.commit()
+    except BaseException:
+        discard_rendered(variants)
+        raise
+    await publish_image_variants(variants, released)
+
+    return {"path": db_course.icon, "variants": public_variants(variants)}
+
+
+@router.get("/{course_id}/image", response_model=CourseImage)
+async def read_course_image(course_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Варианты изображения курса разных ширин и форматов"""
+    db_course = await db.get(Course, course_id)
+    if db_course is None:
+        raise HTTPException(status_code=404, detail="Курс не найден")
 
-    return result
+    variants = await db.run_sync(get_image_variants, "course", course_id)
+    return {"path": db_course.icon, "variants": variants}
 
 
 # Роуты для информации о курсе
 @router.post("/{course_id}/info/", response_model=CourseInfoSchema)
 async def create_course_info_endpoint(
-    course_id: str, info: CourseInfoCreate, db: Session = Depends(get_db)
+    course_id: str, info: CourseInfoCreate, db: AsyncSession = Depends(get_async_db)
 ):
     """Создать блок информации о курсе"""
-    db_course = get_course(db, course_id=course_id)
+    db_course = await db.get(Course, course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Курс не найден")
 
-    return create_course_info(db, course_id, info)
+    return await db.run_sync(create_course_info, course_id, info)
 
 
 @router.put("/{course_id}/info/{info_id}", response_model=CourseInfoSchema)
 async def update_course_info_endpoint(
-    course_id: str, info_id: str, info: CourseInfoCreate, db: Session = Depends(get_db)
+    course_id: str,
+    info_id: str,
+    info: CourseInfoCreate,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Обновить блок информации о курсе"""
-    db_course = get_course(db, course_id=course_id)
+    db_course = await db.get(Course, course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Курс не найден")
 
-    db_info = (
-        db.query(CourseInfo)
-        .filter(CourseInfo.id == info_id, CourseInfo.course_id == course_id)
-        .first()
+    db_info = await db.scalar(
+        select(CourseInfo).where(
+            CourseInfo.id == info_id, CourseInfo.course_id == course_id
+        )
     )
 
     if db_info is None:
@@ -134,32 +334,31 @@ async def update_course_info_endpoint(
     db_info.title = info.title
     db_info.subtitle = info.subtitle
 
-    db.commit()
-    db.refresh(db_info)
+    await db.commit()
 
     return db_info
 
 
 @router.delete("/{course_id}/info/{info_id}")
 async def delete_course_info_endpoint(
-    course_id: str, info_id: str, db: Session = Depends(get_db)
+    course_id: str, info_id: str, db: AsyncSession = Depends(get_async_db)
 ):
     """Удалить блок информации о курсе"""
-    db_course = get_course(db, course_id=course_id)
+    db_course = await db.get(Course, course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Курс не найден")
 
-    db_info = (
-        db.query(CourseInfo)
-        .filter(CourseInfo.id == info_id, CourseInfo.course_id == course_id)
-        .first()
+    db_info = await db.scalar(
+        select(CourseInfo).where(
+            CourseInfo.id == info_id, CourseInfo.course_id == course_id
+        )
     )
 
     if db_info is None:
         raise HTTPException(status_code=404, detail="Информация о курсе не найдена")
 
-    db.delete(db_info)
-    db.commit()
+    await db.delete(db_info)
+    await db.commit()
 
     return {"detail": f"Информация о курсе с ID {info_id} успешно удалена"}
 
@@ -167,14 +366,16 @@ async def delete_course_info_endpoint(
 # Роуты для разделов курса
 @router.post("/{course_id}/sections/", response_model=SectionSchema)
 async def create_section_endpoint(
-    course_id: str, section: SectionCreate, db: Session = Depends(get_db)
+    course_id: str, section: SectionCreate, db: AsyncSession = Depends(get_async_db)
 ):
     """Создать раздел для курса"""
-    db_course = get_course(db, course_id=course_id)
+    db_course = await db.get(Course, course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Курс не найден")
 
-    return create_course_section(db, course_id, section)
+    db_section = await db.run_sync(create_course_section, course_id, section)
+    await db.refresh(db_section, ["content"])
+    return db_section
 
 
 @router.put("/{course_id}/sections/{section_id}", response_model=SectionSchema)
@@ -182,67 +383,97 @@ async def update_section_endpoint(
     course_id: str,
     section_id: str,
     section: SectionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Обновить раздел курса"""
-    db_course = get_course(db, course_id=course_id)
+    db_course = await db.get(Course, course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Курс не найден")
 
-    db_section = (
-        db.query(Section)
-        .filter(Section.id == section_id, Section.course_id == course_id)
-        .first()
+    db_section = await db.scalar(
+        select(Section)
+        .options(SECTION_CONTENT)
+        .where(Section.id == section_id, Section.course_id == course_id)
     )
 
     if db_section is None:
         raise HTTPException(status_code=404, detail="Раздел не найден")
 
     db_section.name = section.name
-    db.commit()
-    db.refresh(db_section)
+    await db.commit()
 
     return db_section
 
 
 @router.delete("/{course_id}/sections/{section_id}")
 async def delete_section_endpoint(
-    course_id: str, section_id: str, db: Session = Depends(get_db)
+    course_id: str, section_id: str, db: AsyncSession = Depends(get_async_db)
 ):
     """Удалить раздел курса"""
-    db_course = get_course(db, course_id=course_id)
+    db_course = await db.get(Course, course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Курс не найден")
 
-    db_section = (
-        db.query(Section)
-        .filter(Section.id == section_id, Section.course_id == course_id)
-        .first()
+    db_section = await db.scalar(
+        select(Section)
+        .options(SECTION_CONTENT)
+        .where(Section.id == section_id, Section.course_id == course_id)
     )
 
     if db_section is None:
         raise HTTPException(status_code=404, detail="Раздел не найден")
 
-    db.delete(db_section)
-    db.commit()
+    await db.delete(db_section)
+    await db.commit()
 
     return {"detail": f"Раздел с ID {section_id} успешно удален"}
 
 
 # Роуты для уроков
+@router.get(
+    "/{course_id}/sections/{section_id}/content/{lesson_id}",
+    response_model=LessonSchema,
+)
+async def read_lesson_endpoint(
+    course_id: str,
+    section_id: str,
+    lesson_id: str,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Получить урок раздела курса вместе с его описанием"""
+    db_lesson = await db.scalar(
+        select(Lesson)
+        .join(Lesson.sections)
+        .options(undefer(Lesson.description))
+        .where(
+            Lesson.id == lesson_id,
+            Section.id == section_id,
+            Section.course_id == course_id,
+        )
+    )
+
+    if db_lesson is None:
+        raise HTTPException(status_code=404, detail="Урок не найден")
+
+    return db_lesson
+
+
 @router.post("/{course_id}/sections/{section_id}/content", response_model=LessonSchema)
 async def create_lesson_endpoint(
-    course_id: str, section_id: str, lesson: LessonCreate, db: Session = Depends(get_db)
+    course_id: str,
+    section_id: str,
+    lesson: LessonCreate,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Создать урок для раздела курса"""
-    db_course = get_course(db, course_id=course_id)
+    db_course = await db.get(Course, course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Курс не найден")
 
-    db_section = (
-        db.query(Section)
-        .filter(Section.id == section_id, Section.course_id == course_id)
-        .first()
+    db_section = await db.scalar(
+        select(Section)
+        .options(SECTION_CONTENT)
+        .where(Section.id == section_id, Section.course_id == course_id)
     )
 
     if db_section is None:
@@ -256,12 +487,9 @@ async def create_lesson_endpoint(
     )
 
     db.add(db_lesson)
-    db.flush()
-
     db_section.content.append(db_lesson)
 
-    db.commit()
-    db.refresh(db_lesson)
+    await db.commit()
 
     return db_lesson
 
@@ -275,23 +503,23 @@ async def update_lesson_endpoint(
     section_id: str,
     lesson_id: str,
     lesson: LessonCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Обновить урок в разделе курса"""
-    db_course = get_course(db, course_id=course_id)
+    db_course = await db.get(Course, course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Курс не найден")
 
-    db_section = (
-        db.query(Section)
-        .filter(Section.id == section_id, Section.course_id == course_id)
-        .first()
+    db_section = await db.scalar(
+        select(Section)
+        .options(SECTION_CONTENT)
+        .where(Section.id == section_id, Section.course_id == course_id)
     )
 
     if db_section is None:
         raise HTTPException(status_code=404, detail="Раздел не найден")
 
-    db_lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
+    db_lesson = await db.get(Lesson, lesson_id, options=[undefer(Lesson.description)])
 
     if db_lesson is None:
         raise HTTPException(status_code=404, detail="Урок не найден")
@@ -301,37 +529,39 @@ async def update_lesson_endpoint(
     if lesson.description:
         db_lesson.description = lesson.description
 
-    db.commit()
-    db.refresh(db_lesson)
+    await db.commit()
 
     return db_lesson
 
 
 @router.delete("/{course_id}/sections/{section_id}/content/{lesson_id}")
 async def delete_lesson_endpoint(
-    course_id: str, section_id: str, lesson_id: str, db: Session = Depends(get_db)
+    course_id: str,
+    section_id: str,
+    lesson_id: str,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Удалить урок из раздела курса"""
-    db_course = get_course(db, course_id=course_id)
+    db_course = await db.get(Course, course_id)
     if db_course is None:
         raise HTTPException(status_code=404, detail="Курс не найден")
 
-    db_section = (
-        db.query(Section)
-        .filter(Section.id == section_id, Section.course_id == course_id)
-        .first()
+    db_section = await db.scalar(
+        select(Section)
+        .options(SECTION_CONTENT)
+        .where(Section.id == section_id, Section.course_id == course_id)
     )
 
     if db_section is None:
         raise HTTPException(status_code=404, detail="Раздел не найден")
 
-    db_lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
+    db_lesson = await db.get(Lesson, lesson_id)
 
     if db_lesson is None:
         raise HTTPException(status_code=404, detail="Урок не найден")
 
     db_section.content.remove(db_lesson)
-    db.delete(db_lesson)
-    db.commit()
+    await db.delete(db_lesson)
+    await db.commit()
 
     return {"detail": f"Урок с ID {lesson_id} успешно удален"}
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from config import settings
+from database import get_async_db
+from schemas.search import SearchResult
+from services.pagination import decode_cursor, next_page_headers
+from services.search import search
+
+router = APIRouter(
+    prefix="/api/search",
+    tags=["search"],
+)
+
+
+@router.get("/", response_model=List[SearchResult])
+async def search_catalog(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1),
+    kind: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=settings.PAGE_MAX_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Полнотекстовый поиск по курсам, разделам и урокам.
+
+    Результаты упорядочены по релевантности, совпадения в названии важнее
+    совпадений в описании. kind=course|section|lesson ограничивает тип
+    результатов. Курсор следующей страницы передается в заголовках
+    X-Next-Cursor и Link.
+    """
+    try:
+        after = decode_cursor(cursor, 2) if cursor is not None else None
+        if after is not None and not (
+            isinstance(after[0], (int, float)) and isinstance(after[1], int)
+        ):
+            raise ValueError("Некорректный курсор")
+        results, next_cursor = await db.run_sync(search, q, kind, after, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response.headers.update(next_page_headers(request, next_cursor, limit))
+    return results
@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Header, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+
+from schemas.upload import UploadCreate, UploadFinalize
+from services.uploads import (
+    UploadSessionError,
+    abort_upload,
+    create_upload_session,
+    finalize_upload,
+    get_upload,
+    write_upload_chunk,
+)
+
+router = APIRouter(
+    prefix="/api/uploads",
+    tags=["uploads"],
+    responses={404: {"description": "Не найдено"}},
+)
+
+
+@router.post("/", status_code=201)
+async def create_upload(upload: UploadCreate):
+    """Начать загрузку файла по частям.
+
+    Возвращает ID загрузки, размер и число частей. Части отправляются
+    запросами PUT /api/uploads/{upload_id}/chunks/{index}, после чего
+    загрузка завершается POST /api/uploads/{upload_id}/finalize.
+    """
+    try:
+        return await run_in_threadpool(
+            create_upload_session,
+            upload.filename,
+            upload.size,
+            upload.content_type,
+            upload.sha256,
+            upload.chunk_size,
+        )
+    except UploadSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+
+@router.get("/{upload_id}")
+async def read_upload(upload_id: str):
+    """Состояние загрузки; missing_chunks - части, которые нужно дослать"""
+    try:
+        return await run_in_threadpool(get_upload, upload_id)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+
+@router.put("/{upload_id}/chunks/{index}")
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    x_chunk_sha256: Optional[str] = Header(None),
+):
+    """Принять часть index (с нуля) телом запроса.
+
+    Часть занимает байты с index * chunk_size; заголовок X-Chunk-SHA256
+    позволяет сразу проверить ее содержимое.
+    """
+    try:
+        return await write_upload_chunk(
+            upload_id, index, request.stream(), x_chunk_sha256
+        )
+    except UploadSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+
+@router.post("/{upload_id}/finalize")
+async def finalize(upload_id: str, body: Optional[UploadFinalize] = None):
+    """Завершить загрузку: проверить части и SHA-256 файла"""
+    sha256 = body.sha256 if body is not None else None
+    try:
+        return await run_in_threadpool(finalize_upload, upload_id, sha256)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+
+@router.delete("/{upload_id}")
+async def delete_upload(upload_id: str):
+    """Отменить загрузку и удалить принятые части"""
+    try:
+        await run_in_threadpool(abort_upload, upload_id)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    return {"message": "Загрузка отменена"}
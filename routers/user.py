@@ -1,37 +1,78 @@
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Depends,
+    File,
+    UploadFile,
+    Form,
+    Query,
+    Request,
+    Response,
+)
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.user import User
-from models.course import Lesson
+from models.course import Course, Lesson
+from models.progress import UserCourseProgress, UserLessonProgress
+from schemas.course import CourseOut
 from schemas.user import (
     UserCreate,
     UserUpdate,
     UserOut,
     SendVerificationCode,
     UserCourse,
+    BulkEnrollment,
+    BulkEnrollmentResult,
     LessonCompletion,
+    CourseProgress,
+    CourseLessonsProgress,
 )
-from database import SessionLocal, get_db
-import os
-import shutil
+from config import settings
+from database import get_async_db
 from random import randint
-from utils import send_email
+from services.email_outbox import enqueue_verification_code
+from services.enrollment import (
+    enroll_users,
+    get_user_courses,
+    remove_enrollments,
+    unenroll_user,
+)
+from services.images import (
+    ImageProcessingError,
+    default_variant_url,
+    discard_rendered,
+    get_image_variants,
+    public_variants,
+    publish_image_variants,
+    remove_image_variants,
+    render_image,
+    replace_image_variants,
+)
+from services.media import collect_garbage
+from services.uploads import remove_spooled, spool_upload
+from starlette.concurrency import run_in_threadpool
 from models.VerificationCode import VerificationCode
-from typing import List
-from pathlib import Path
-from services.auth import get_password_hash
+from typing import List, Optional
+from services.auth import (
+    get_current_active_admin,
+    get_current_active_user,
+    get_password_hash_async,
+    invalidate_user_principals,
+)
+from services.pagination import decode_cursor, encode_cursor, next_page_headers
+from services.progress import (
+    get_completed_lessons,
+    get_user_progress,
+    record_completion,
+)
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
-# Создаем директорию для аватарок, если не существует
-BASE_DIR = Path(__file__).resolve().parent.parent
-USERS_AVATAR_DIR = BASE_DIR / "UsersAvatar"
-USERS_AVATAR_DIR.mkdir(exist_ok=True)
-
 
 @router.post("/confirm_email/")
-def confirm_email(
+async def confirm_email(
     user_data: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # Извлекаем данные из JSON
     email = user_data.get("email")
@@ -40,73 +81,41 @@ def confirm_email(
     password = user_data.get("password")
 
     # Проверяем, существует ли запись с этим email и кодом
-    db_verification = (
-        db.query(VerificationCode)
-        .filter(
+    db_verification = await db.scalar(
+        select(VerificationCode).where(
             VerificationCode.email == email, VerificationCode.code == verification_code
         )
-        .first()
     )
 
     if not db_verification:
         raise HTTPException(status_code=400, detail="Invalid verification code")
 
+    # Завершаем читающую транзакцию: на время bcrypt соединение
+    # возвращается в пул и доступно другим запросам
+    await db.commit()
+
     # Хешируем пароль
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
 
     # Создаем пользователя
     db_user = User(email=email, login=login, password=hashed_password, role="student")
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
-    # Удаляем код после успешной регистрации
-    db.delete(db_verification)
-    db.commit()
-
-    return {"message": "User registered successfully", "user": db_user}
-
-
-@router.post("/confirm_email/")
-def confirm_email(
-    user_data: dict,
-    db: Session = Depends(get_db),
-):
-    # Извлекаем данные из JSON
-    email = user_data.get("email")
-    verification_code = user_data.get("verification_code")
-    login = user_data.get("login")
-    password = user_data.get("password")
-
-    # Проверяем, существует ли запись с этим email и кодом
-    db_verification = (
-        db.query(VerificationCode)
-        .filter(
-            VerificationCode.email == email, VerificationCode.code == verification_code
-        )
-        .first()
-    )
-
-    if not db_verification:
-        raise HTTPException(status_code=400, detail="Invalid verification code")
-
-    # Создаем пользователя
-    db_user = User(email=email, login=login, password=password, role="student")
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     # Удаляем код после успешной регистрации
-    db.delete(db_verification)
-    db.commit()
+    await db.delete(db_verification)
+    await db.commit()
 
     return {"message": "User registered successfully", "user": db_user}
 
 
 @router.post("/send_verification_code/")
-def send_verification_code(data: SendVerificationCode, db: Session = Depends(get_db)):
+async def send_verification_code(
+    data: SendVerificationCode, db: AsyncSession = Depends(get_async_db)
+):
     # Проверяем, не зарегистрирован ли уже пользователь с таким email
-    db_user = db.query(User).filter(User.email == data.email).first()
+    db_user = await db.scalar(select(User).where(User.email == data.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
@@ -116,19 +125,18 @@ def send_verification_code(data: SendVerificationCode, db: Session = Depends(get
     # Сохраняем код в базе данных временно
     db_verification = VerificationCode(email=data.email, code=verification_code)
     db.add(db_verification)
-    db.commit()
 
-    # Отправка кода на email
-    send_email(data.email, verification_code)
+    # Ставим письмо с кодом в очередь, отправит его фоновый отправитель
+    await db.run_sync(enqueue_verification_code, data.email, verification_code)
 
     return {"message": "Verification code sent to your email"}
 
 
 @router.put("/{user_id}", response_model=UserOut)
 async def update_user(
-    user_id: int, user_data: UserUpdate, db: Session = Depends(get_db)
+    user_id: int, user_data: UserUpdate, db: AsyncSession = Depends(get_async_db)
 ):
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = await db.get(User, user_id)
 
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -139,111 +147,227 @@ async def update_user(
     # Особая обработка для email, если он был передан
     if "email" in user_data_dict and user_data_dict["email"] != db_user.email:
         verification_code = str(randint(1000, 9999))
-        send_email(user_data_dict["email"], verification_code)
+        await db.run_sync(
+            enqueue_verification_code, user_data_dict["email"], verification_code
+        )
 
     # Обновляем все переданные поля
     for key, value in user_data_dict.items():
         setattr(db_user, key, value)
 
-    db.commit()
-    db.refresh(db_user)
+    invalidate_user_principals(db, user_id)
+    await db.commit()
+    await db.refresh(db_user)
 
     return db_user
 
 
 @router.get("/", response_model=List[UserOut])
-def get_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
+async def get_users(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Страница пользователей, упорядоченных по ID.
+
+    Курсор следующей страницы передается в заголовках X-Next-Cursor и Link.
+    """
+    query = select(User).order_by(User.id).limit(limit + 1)
+    if cursor is not None:
+        try:
+            (after_id,) = decode_cursor(cursor, 1)
+            if not isinstance(after_id, int):
+                raise ValueError("Некорректный курсор")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(User.id > after_id)
+
+    users = (await db.scalars(query)).all()
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].id)
+    response.headers.update(next_page_headers(request, next_cursor, limit))
     return users
 
 
 @router.delete("/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.id == user_id).first()
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.get(User, user_id)
 
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Удаляем пользователя из БД
-    db.delete(db_user)
-    db.commit()
-
-    # Удаляем директорию с аватаром пользователя при наличии
-    user_avatar_dir = USERS_AVATAR_DIR / str(user_id)
-    if user_avatar_dir.exists():
-        shutil.rmtree(user_avatar_dir)
+    # Удаляем пользователя, его записи на курсы и прогресс из БД
+    await db.run_sync(remove_enrollments, user_id=user_id)
+    await db.delete(db_user)
+    await db.execute(
+        delete(UserLessonProgress).where(UserLessonProgress.user_id == user_id)
+    )
+    await db.execute(
+        delete(UserCourseProgress).where(UserCourseProgress.user_id == user_id)
+    )
+    released = await db.run_sync(remove_image_variants, "user", user_id)
+    invalidate_user_principals(db, user_id)
+    await db.commit()
+    await run_in_threadpool(collect_garbage, released)
 
     return {"message": f"User with ID {user_id} successfully deleted"}
 
 
-# Роут для добавления курса пользователю
+# Роут для записи пользователя на курс
 @router.post("/course")
-def add_user_course(user_course: UserCourse, db: Session = Depends(get_db)):
+async def add_user_course(
+    user_course: UserCourse, db: AsyncSession = Depends(get_async_db)
+):
     # Проверяем существование пользователя
-    db_user = db.query(User).filter(User.id == user_course.user_id).first()
+    db_user = await db.get(User, user_course.user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Здесь можно добавить логику для проверки существования курса
-    # и добавления в таблицу связей пользователь-курс
+    if not await db.get(Course, user_course.course_id):
+        raise HTTPException(status_code=404, detail="Course not found")
 
-    # Создаем запись в БД (здесь нужно создать модель связи)
-    # db_user_course = UserCourseModel(user_id=user_course.user_id, course_id=user_course.course_id)
-    # db.add(db_user_course)
-    # db.commit()
+    # Повторная запись на курс ничего не меняет
+    await db.run_sync(enroll_users, user_course.course_id, [user_course.user_id])
 
-    # Пока просто возвращаем успешный ответ
     return {
         "message": f"Course {user_course.course_id} added to user {user_course.user_id}"
     }
 
 
+# Массовая запись на курс (например, всего потока к началу семестра)
+@router.post("/course/bulk", response_model=BulkEnrollmentResult)
+async def bulk_enroll(
+    enrollment: BulkEnrollment,
+    current_user=Depends(get_current_active_admin),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Записать на курс список пользователей одной транзакцией.
+
+    Несуществующие и уже записанные пользователи пропускаются и
+    учитываются в ответе.
+    """
+    if not await db.get(Course, enrollment.course_id):
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    return await db.run_sync(enroll_users, enrollment.course_id, enrollment.user_ids)
+
+
+@router.delete("/{user_id}/courses/{course_id}")
+async def remove_user_course(
+    user_id: int, course_id: str, db: AsyncSession = Depends(get_async_db)
+):
+    """Отписать пользователя от курса"""
+    if not await db.run_sync(unenroll_user, user_id, course_id):
+        raise HTTPException(status_code=404, detail="Enrollment not found")
+
+    return {"message": f"Course {course_id} removed from user {user_id}"}
+
+
+@router.get("/me/courses", response_model=List[CourseOut])
+async def read_my_courses(
+    current_user=Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Курсы, на которые записан текущий пользователь"""
+    return await db.run_sync(get_user_courses, current_user.id)
+
+
 # Роут для отметки урока как пройденного
 @router.post("/lesson/complete")
-def complete_lesson(completion: LessonCompletion, db: Session = Depends(get_db)):
+async def complete_lesson(
+    completion: LessonCompletion, db: AsyncSession = Depends(get_async_db)
+):
     # Проверяем существование пользователя
-    db_user = db.query(User).filter(User.id == completion.user_id).first()
+    db_user = await db.get(User, completion.user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Проверяем существование урока
-    db_lesson = db.query(Lesson).filter(Lesson.id == completion.lesson_id).first()
+    db_lesson = await db.get(Lesson, completion.lesson_id)
     if not db_lesson:
         raise HTTPException(status_code=404, detail="Lesson not found")
 
-    # Обновляем статус прохождения
-    db_lesson.passing = "yes"
-    db.commit()
+    # Отметка записывается в прогресс пользователя групповым коммитом
+    await record_completion(completion.user_id, completion.lesson_id)
 
     return {
         "message": f"Lesson {completion.lesson_id} marked as completed for user {completion.user_id}"
     }
 
 
+@router.get("/me/progress", response_model=List[CourseProgress])
+async def read_my_progress(
+    current_user=Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Процент прохождения каждого курса, на который записан пользователь"""
+    return await db.run_sync(get_user_progress, current_user.id)
+
+
+@router.get("/me/progress/{course_id}", response_model=CourseLessonsProgress)
+async def read_my_course_progress(
+    course_id: str,
+    current_user=Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Пройденные пользователем уроки курса"""
+    lesson_ids = await db.run_sync(get_completed_lessons, current_user.id, course_id)
+    return {"course_id": course_id, "completed_lessons": lesson_ids}
+
+
 @router.post("/{user_id}/avatar")
 async def upload_avatar(
-    user_id: int, avatar: UploadFile = File(...), db: Session = Depends(get_db)
+    user_id: int,
+    avatar: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = await db.get(User, user_id)
 
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Создаем директорию для аватара пользователя
-    user_avatar_dir = USERS_AVATAR_DIR / str(user_id)
-    user_avatar_dir.mkdir(exist_ok=True, parents=True)
-
-    # Получаем расширение файла
-    file_extension = os.path.splitext(avatar.filename)[1]
-    avatar_path = user_avatar_dir / f"avatar{file_extension}"
+    if not (avatar.content_type or "").startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
 
-    # Сохраняем файл
-    with avatar_path.open("wb") as buffer:
-        shutil.copyfileobj(avatar.file, buffer)
+    # Аватар уменьшается до нескольких ширин и сохраняется в WebP и JPEG
+    path, _, _ = await spool_upload(avatar)
+    try:
+        variants = await render_image(path, avatar.content_type)
+    except ImageProcessingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        remove_spooled(path)
 
     # Обновляем путь к аватару в БД
-    db_user.img = f"UsersAvatar/{user_id}/avatar{file_extension}"
-    db.commit()
-    db.refresh(db_user)
+    try:
+        released = await db.run_sync(replace_image_variants, "user", user_id, variants)
+        db_user.img = default_variant_url(variants)
+        invalidate_user_principals(db, user_id)
+        await db.commit()
+    except BaseException:
+        discard_rendered(variants)
+        raise
+    await publish_image_variants(variants, released)
+    await db.refresh(db_user)
+
+    return {
+        "message": "Avatar uploaded successfully",
+        "img_path": db_user.img,
+        "variants": public_variants(variants),
+    }
+
+
+@router.get("/{user_id}/avatar")
+async def read_avatar(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Варианты аватара пользователя разных ширин и форматов"""
+    db_user = await db.get(User, user_id)
+
+    if not db_user:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    return {"message": "Avatar uploaded successfully", "img_path": db_user.img}
+    variants = await db.run_sync(get_image_variants, "user", user_id)
+    return {"img_path": db_user.img, "variants": variants}
@@ -60,10 +60,14 @@ class CourseBase(BaseModel):
     titleForCourse: str
 
 
+class SectionImport(SectionBase):
+    content: List[LessonCreate] = []
+
+
 class CourseCreate(CourseBase):
     id: Optional[str] = None
     info: List[CourseInfoCreate] = []
-    sections: List[SectionCreate] = []
+    sections: List[SectionImport] = []
 
 
 class CourseUpdate(CourseBase):
@@ -72,6 +76,67 @@ class CourseUpdate(CourseBase):
     sections: Optional[List[SectionCreate]] = None
 
 
+class CourseImport(CourseBase):
+    # ID курса задается при импорте каталога; если его нет, генерируется
+    id: Optional[str] = None
+    info: List[CourseInfoCreate] = []
+    sections: List[SectionImport] = []
+
+
+class LessonSummary(BaseModel):
+    id: str
+    name: str
+    passing: str
+    description: Optional[str] = None  # Только при include=descriptions
+
+
+class SectionSummary(SectionBase):
+    content: Optional[List[LessonSummary]] = None  # Только при include=lessons
+
+
+class CourseSummary(BaseModel):
+    # Карточка курса в каталоге: набор полей задается параметром fields,
+    # вложенные уровни - параметром include
+    id: str
+    title: Optional[str] = None
+    subtitle: Optional[str] = None
+    type: Optional[str] = None
+    timetoendL: Optional[str] = None
+    color: Optional[str] = None
+    icon: Optional[str] = None
+    icontype: Optional[str] = None
+    titleForCourse: Optional[str] = None
+    info: Optional[List[CourseInfo]] = None
+    sections: Optional[List[SectionSummary]] = None
+
+
+class ImageVariant(BaseModel):
+    width: Optional[int] = None
+    height: Optional[int] = None
+    format: str
+    url: str
+
+
+class CourseImage(BaseModel):
+    # path - вариант по умолчанию (Course.icon), variants - все размеры
+    path: Optional[str] = None
+    variants: List[ImageVariant] = []
+
+
+class PdfCommit(BaseModel):
+    # Либо токен предпросмотра (ID задачи), либо проверенная структура курса
+    job_id: Optional[str] = None
+    course: Optional[CourseImport] = None
+
+
+class CourseOut(CourseBase):
+    # Курс без info и разделов (списки курсов пользователя)
+    id: str
+
+    class Config:
+        orm_mode = True
+
+
 class Course(CourseBase):
     id: str
     info: List[CourseInfo] = []
@@ -0,0 +1,14 @@
+# schemas/search.py
+from pydantic import BaseModel
+from typing import Optional
+
+
+class SearchResult(BaseModel):
+    kind: str  # course, section или lesson
+    id: str
+    title: Optional[str] = None
+    # Фрагмент текста с совпадениями, выделенными тегом <mark>
+    snippet: Optional[str] = None
+    # Где находится найденный раздел или урок
+    course_id: Optional[str] = None
+    section_id: Optional[str] = None
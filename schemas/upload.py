@@ -0,0 +1,17 @@
+# schemas/upload.py
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class UploadCreate(BaseModel):
+    filename: str
+    size: int = Field(..., gt=0)
+    content_type: Optional[str] = None
+    # SHA-256 всего файла; можно передать и при завершении загрузки
+    sha256: Optional[str] = None
+    # Размер части; по умолчанию RESUMABLE_CHUNK_SIZE
+    chunk_size: Optional[int] = Field(None, ge=64 * 1024)
+
+
+class UploadFinalize(BaseModel):
+    sha256: Optional[str] = None
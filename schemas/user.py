@@ -52,6 +52,30 @@ class UserCourse(BaseModel):
     user_id: int
 
 
+class BulkEnrollment(BaseModel):
+    course_id: str
+    user_ids: List[int]
+
+
+class BulkEnrollmentResult(BaseModel):
+    enrolled: int
+    already_enrolled: int
+    unknown_users: int
+
+
 class LessonCompletion(BaseModel):
     lesson_id: str
     user_id: int
+
+
+class CourseProgress(BaseModel):
+    course_id: str
+    title: Optional[str] = None
+    completed_lessons: int
+    total_lessons: int
+    percent: int
+
+
+class CourseLessonsProgress(BaseModel):
+    course_id: str
+    completed_lessons: List[str]
@@ -1,14 +1,22 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from config import settings
+from database import get_async_db
 from models.user import User
 from schemas.user import UserOut
+from services.cache_sync import mark_stale, register_cache
 
 # Настройки безопасности
 SECRET_KEY = (
@@ -21,6 +29,25 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 1 день
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
+# Пул потоков для bcrypt: хеширование занимает сотни миллисекунд CPU,
+# поэтому выполняется вне цикла событий и с ограниченным параллелизмом.
+# При всплеске входов запросы ждут в очереди пула, не блокируя остальные.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_hash_stats_lock = threading.Lock()
+_hash_stats = {"in_flight": 0, "active": 0, "completed": 0}
+
+# Кеш проверенных токенов: токен -> (данные пользователя, срок годности).
+# Порядок OrderedDict используется для вытеснения давно не использованных.
+# При изменении любого пользователя кеш очищается во всех процессах.
+PRINCIPAL_CACHE = "principals"
+_principal_cache_lock = threading.Lock()
+_principal_cache: "OrderedDict[str, tuple]" = OrderedDict()
+# Растет при каждой очистке: пользователь, прочитанный из базы до очистки,
+# не попадает в кеш после нее
+_principal_epoch = 0
+
 
 def verify_password(plain_password, hashed_password):
     """Проверяет соответствие пароля хешу"""
@@ -32,29 +59,74 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-def authenticate_user(db: Session, username: str, password: str):
+def _run_tracked(func, *args):
+    with _hash_stats_lock:
+        _hash_stats["active"] += 1
+    try:
+        return func(*args)
+    finally:
+        with _hash_stats_lock:
+            _hash_stats["active"] -= 1
+            _hash_stats["completed"] += 1
+
+
+async def _run_in_hash_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    with _hash_stats_lock:
+        _hash_stats["in_flight"] += 1
+    try:
+        return await loop.run_in_executor(_hash_executor, _run_tracked, func, *args)
+    finally:
+        with _hash_stats_lock:
+            _hash_stats["in_flight"] -= 1
+
+
+async def verify_password_async(plain_password, hashed_password):
+    """Проверяет пароль в пуле хеширования, не блокируя цикл событий"""
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    """Создает хеш пароля в пуле хеширования, не блокируя цикл событий"""
+    return await _run_in_hash_pool(get_password_hash, password)
+
+
+def password_hash_pool_stats():
+    """Состояние пула хеширования паролей для метрик"""
+    with _hash_stats_lock:
+        return {
+            "workers": settings.PASSWORD_HASH_WORKERS,
+            "active": _hash_stats["active"],
+            "queued": _hash_stats["in_flight"] - _hash_stats["active"],
+            "completed": _hash_stats["completed"],
+        }
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
     """Аутентифицирует пользователя по логину/email и паролю"""
     # Ищем пользователя по логину или email
-    user = (
-        db.query(User)
-        .filter((User.login == username) | (User.email == username))
-        .first()
+    user = await db.scalar(
+        select(User).where((User.login == username) | (User.email == username))
     )
 
     if not user:
         return False
 
+    # Завершаем читающую транзакцию: на время bcrypt соединение
+    # возвращается в пул и доступно другим запросам
+    await db.commit()
+
     # Для существующих пользователей у которых пароль не хеширован
     if not user.password.startswith("$2b$"):  # Проверяем, хеширован ли пароль
         # Сравниваем пароли напрямую
         if password != user.password:
             return False
         # Хешируем пароль и обновляем в базе данных
-        user.password = get_password_hash(password)
-        db.commit()
+        user.password = await get_password_hash_async(password)
+        await db.commit()
     else:
         # Для новых пользователей с хешированными паролями
-        if not verify_password(password, user.password):
+        if not await verify_password_async(password, user.password):
             return False
 
     return user
@@ -75,10 +147,77 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def _cache_get(token: str):
+    with _principal_cache_lock:
+        entry = _principal_cache.get(token)
+        if entry is None:
+            return None
+        principal, expires_at = entry
+        if expires_at <= time.time():
+            del _principal_cache[token]
+            return None
+        _principal_cache.move_to_end(token)
+        return principal
+
+
+def _cache_epoch():
+    with _principal_cache_lock:
+        return _principal_epoch
+
+
+def _cache_put(token: str, principal: UserOut, token_exp: float, epoch: int):
+    # Запись живет не дольше самого токена и не дольше AUTH_CACHE_TTL_SECONDS
+    expires_at = min(token_exp, time.time() + settings.AUTH_CACHE_TTL_SECONDS)
+    with _principal_cache_lock:
+        if _principal_epoch != epoch:
+            return
+        _principal_cache[token] = (principal, expires_at)
+        _principal_cache.move_to_end(token)
+        while len(_principal_cache) > settings.AUTH_CACHE_SIZE:
+            _principal_cache.popitem(last=False)
+
+
+def _clear_principal_cache(user_ids=None):
+    global _principal_epoch
+    with _principal_cache_lock:
+        _principal_epoch += 1
+        if user_ids is None:
+            _principal_cache.clear()
+            return
+        stale = [
+            token
+            for token, (principal, _) in _principal_cache.items()
+            if str(principal.id) in user_ids
+        ]
+        for token in stale:
+            del _principal_cache[token]
+
+
+register_cache(PRINCIPAL_CACHE, _clear_principal_cache)
+
+
+def invalidate_user_principals(db, user_id: int):
+    """Сбросить кешированные токены пользователя после коммита транзакции db.
+
+    Вызывается до коммита изменения пользователя: в этом процессе удаляются
+    только записи этого пользователя, остальные обработчики при опросе
+    поколений очищают кеш целиком.
+    """
+    mark_stale(db, PRINCIPAL_CACHE, {str(user_id)})
+
+
 async def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
 ):
-    """Получает текущего пользователя по токену"""
+    """Получает текущего пользователя по токену.
+
+    Проверенные токены и данные их владельцев кешируются, поэтому
+    повторные запросы с тем же токеном не обращаются к базе данных.
+    """
+    principal = _cache_get(token)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Неверные учетные данные",
@@ -94,14 +233,26 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == user_id).first()
+    # Поколение запоминается до чтения: если пользователя изменят, пока
+    # идет запрос, прочитанные данные уже устарели и в кеш не попадут
+    epoch = _cache_epoch()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if user is None:
         raise credentials_exception
 
-    return user
+    principal = UserOut.model_validate(user, from_attributes=True)
+    _cache_put(token, principal, payload["exp"], epoch)
+    return principal
 
 
 async def get_current_active_user(current_user=Depends(get_current_user)):
     """Проверяет, что пользователь активен"""
     return current_user
+
+
+async def get_current_active_admin(current_user=Depends(get_current_user)):
+    """Проверяет, что пользователь является администратором"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    return current_user
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import async_engine
+from models.cache_generation import CacheGeneration
+
+# Согласование кешей в памяти между процессами-обработчиками.
+#
+# У каждого кеша есть имя и номер поколения в таблице cache_generations.
+# Транзакция, изменившая закешированные данные, помечает кеш через
+# mark_stale и при коммите увеличивает его поколение. Процесс, сделавший
+# изменение, сразу очищает в своем кеше затронутые ключи, остальные замечают
+# новое поколение при опросе таблицы и очищают свои кеши целиком.
+# Внешний брокер не нужен.
+
+_SESSION_KEY = "stale_caches"
+_BUMPED_KEY = "bumped_cache_generations"
+
+_handlers: Dict[str, List[Callable[[Optional[set]], None]]] = {}
+_handlers_lock = threading.Lock()
+_seen: Dict[str, int] = {}
+_sync_task: Optional[asyncio.Task] = None
+
+
+def register_cache(name: str, clear: Callable[[Optional[set]], None]):
+    """Зарегистрировать функцию очистки локального кеша с данным именем.
+
+    clear получает множество устаревших ключей или None, если очистить
+    нужно весь кеш.
+    """
+    with _handlers_lock:
+        _handlers.setdefault(name, []).append(clear)
+
+
+def _clear_local(name: str, keys: Optional[set] = None):
+    with _handlers_lock:
+        handlers = list(_handlers.get(name, ()))
+    for clear in handlers:
+        clear(keys)
+
+
+def mark_stale(db, name: str, keys: Optional[Iterable] = None):
+    """Пометить ключи кеша (или весь кеш) устаревшими после коммита.
+
+    Принимает как Session, так и AsyncSession.
+    """
+    session = getattr(db, "sync_session", db)
+    stale = session.info.setdefault(_SESSION_KEY, {})
+    if keys is None or (name in stale and stale[name] is None):
+        stale[name] = None
+    else:
+        stale.setdefault(name, set()).update(keys)
+
+
+def bump_generation(db: Session, name: str):
+    """Увеличить поколение кеша в текущей транзакции и вернуть его"""
+    generation = db.execute(
+        update(CacheGeneration)
+        .where(CacheGeneration.name == name)
+        .values(generation=CacheGeneration.generation + 1)
+        .returning(CacheGeneration.generation)
+    ).scalar()
+    if generation is None:
+        generation = 1
+        db.execute(insert(CacheGeneration).values(name=name, generation=generation))
+    return generation
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_stale_generations(session: Session):
+    # Commit сбрасывает изменения уже после этого события, а события
+    # маппера при сбросе тоже могут пометить кеши, поэтому сбрасываем сами
+    session.flush()
+    # Поколения увеличиваются в той же транзакции, что и сами изменения
+    session.info[_BUMPED_KEY] = {
+        name: bump_generation(session, name)
+        for name in sorted(session.info.get(_SESSION_KEY, ()))
+    }
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_stale_caches(session: Session):
+    bumped = session.info.pop(_BUMPED_KEY, {})
+    for name, keys in session.info.pop(_SESSION_KEY, {}).items():
+        generation = bumped.get(name)
+        # Если других изменений с прошлого опроса не было, свое поколение
+        # считаем увиденным, и опрос не очистит кеш этого процесса целиком
+        if generation is not None and _seen.get(name) == generation - 1:
+            _seen[name] = generation
+        _clear_local(name, keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_stale_caches(session: Session):
+    session.info.pop(_SESSION_KEY, None)
+    session.info.pop(_BUMPED_KEY, None)
+
+
+async def _poll_generations():
+    async with async_engine.connect() as conn:
+        rows = await conn.execute(
+            select(CacheGeneration.name, CacheGeneration.generation)
+        )
+        generations = dict(rows.all())
+
+    for name, generation in generations.items():
+        if _seen.get(name) != generation:
+            _seen[name] = generation
+            _clear_local(name)
+
+
+async def _sync_loop():
+    while True:
+        try:
+            await _poll_generations()
+        except Exception as e:
+            print(f"Error in cache sync: {e}")
+        await asyncio.sleep(settings.CACHE_SYNC_INTERVAL_SECONDS)
+
+
+async def start_cache_sync():
+    """Запустить опрос поколений кешей.
+
+    Первый опрос выполняется сразу, чтобы запомнить текущие поколения.
+    """
+    global _sync_task
+    await _poll_generations()
+    _sync_task = asyncio.create_task(_sync_loop())
+
+
+async def stop_cache_sync():
+    """Остановить опрос поколений кешей"""
+    global _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        try:
+            await _sync_task
+        except asyncio.CancelledError:
+            pass
+        _sync_task = None
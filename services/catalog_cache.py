@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from config import settings
+from services.cache_sync import mark_stale, register_cache
+
+# Кеш каталога курсов: готовые страницы каталога (по одной на каждую
+# проекцию include/fields, курсор и limit) и JSON отдельных деревьев курсов.
+# Записи сбрасываются при изменении курсов, см. services.course_versions.
+# Каждая запись хранит версию, с которой она загружена: другие процессы
+# узнают об изменениях только при опросе поколений, поэтому запись другой
+# версии считается промахом, и ответ не расходится со своим ETag.
+CATALOG_CACHE = "catalog"
+
+# Максимум одновременно закешированных страниц каталога
+CATALOG_PAGES_MAX = 64
+
+_lock = threading.Lock()
+_catalogs: "OrderedDict[str, tuple]" = OrderedDict()
+_trees: "OrderedDict[str, tuple]" = OrderedDict()
+# Номер очистки: данные, прочитанные до очистки, в кеш не попадают
+_epoch = 0
+_stats = {"hits": 0, "misses": 0}
+
+
+def _clear(course_ids: Optional[set] = None):
+    global _epoch
+    with _lock:
+        _epoch += 1
+        _catalogs.clear()
+        if course_ids is None:
+            _trees.clear()
+        else:
+            for course_id in course_ids:
+                _trees.pop(course_id, None)
+
+
+register_cache(CATALOG_CACHE, _clear)
+
+
+def invalidate_courses(db, course_ids=None):
+    """Сбросить каталог и деревья курсов course_ids (None - все) после коммита"""
+    mark_stale(db, CATALOG_CACHE, course_ids)
+
+
+def _get_or_load(
+    entries: OrderedDict,
+    key: str,
+    version,
+    limit: int,
+    loader: Callable[[], Any],
+):
+    with _lock:
+        entry = entries.get(key)
+        if entry is not None and entry[0] == version:
+            _stats["hits"] += 1
+            entries.move_to_end(key)
+            return entry[1]
+        _stats["misses"] += 1
+        epoch = _epoch
+
+    data = loader()
+    if data is None:
+        return None
+
+    with _lock:
+        if _epoch == epoch:
+            entries[key] = (version, data)
+            entries.move_to_end(key)
+            while len(entries) > limit:
+                entries.popitem(last=False)
+    return data
+
+
+def get_catalog_page(key: str, version, loader: Callable[[], tuple]):
+    """Получить страницу каталога (JSON и курсор следующей) из кеша или через loader.
+
+    version - версия каталога, с которой страница должна совпадать.
+    """
+    return _get_or_load(_catalogs, key, version, CATALOG_PAGES_MAX, loader)
+
+
+def get_course(course_id: str, version, loader: Callable[[], Optional[bytes]]):
+    """Получить JSON дерева курса версии version из кеша или через loader.
+
+    Результат loader None (курса нет) не кешируется.
+    """
+    return _get_or_load(_trees, course_id, version, settings.CATALOG_CACHE_SIZE, loader)
+
+
+def catalog_cache_stats():
+    """Счетчики попаданий и промахов кеша каталога"""
+    with _lock:
+        return {
+            **_stats,
+            "catalogs_cached": len(_catalogs),
+            "courses_cached": len(_trees),
+        }
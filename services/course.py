@@ -1,23 +1,48 @@
-from sqlalchemy.orm import Session
-import os
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import and_, insert, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only, selectinload
+import json
 import uuid
-import shutil
-from pathlib import Path
-from fastapi import UploadFile, HTTPException
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException
 
-from models.course import Course, CourseInfo, Section, Lesson
+from config import settings
+from database import SessionLocal
+from models.course import Course, CourseInfo, Section, Lesson, lesson_section
 from schemas.course import (
+    Course as CourseSchema,
     CourseCreate,
+    CourseImport,
     CourseUpdate,
     CourseInfoCreate,
     SectionCreate,
     LessonCreate,
 )
-
-
-def get_courses(db: Session):
-    """Получить все курсы"""
-    return db.query(Course).all()
+from services import catalog_cache
+from services.course_versions import courses_changed
+from services.enrollment import remove_enrollments
+from services.images import remove_image_variants
+from services.pagination import encode_cursor
+from services.progress import course_lessons_changed
+
+_course_adapter = TypeAdapter(CourseSchema)
+
+
+def course_tree_options():
+    """Стратегия загрузки дерева курса: info, разделы и уроки разделов.
+
+    Каждый уровень дерева подгружается одним SELECT ... IN, поэтому
+    число запросов не зависит от количества курсов, разделов и уроков.
+    Отложенное описание уроков загружается тем же запросом.
+    """
+    return (
+        selectinload(Course.info),
+        selectinload(Course.sections)
+        .selectinload(Section.content)
+        .undefer(Lesson.description),
+    )
 
 
 def get_course(db: Session, course_id: str):
@@ -25,48 +50,345 @@ def get_course(db: Session, course_id: str):
     return db.query(Course).filter(Course.id == course_id).first()
 
 
+def get_course_tree(db: Session, course_id: str):
+    """Получить курс по ID вместе с деревом разделов и уроков"""
+    return (
+        db.query(Course)
+        .options(*course_tree_options())
+        .filter(Course.id == course_id)
+        .first()
+    )
+
+
+def get_course_tree_json(db: Session, course_id: str, version):
+    """Дерево курса в виде готового JSON или None, если курса нет.
+
+    version - версия курса, прочитанная для ETag: запись кеша другой
+    версии загружается заново.
+    """
+
+    def load():
+        course = get_course_tree(db, course_id)
+        if course is None:
+            return None
+        return _course_adapter.dump_json(
+            _course_adapter.validate_python(course, from_attributes=True)
+        )
+
+    return catalog_cache.get_course(course_id, version, load)
+
+
+# Колонки курса, которые переносятся из входных данных как есть
+COURSE_COLUMNS = (
+    "id",
+    "title",
+    "subtitle",
+    "type",
+    "timetoendL",
+    "color",
+    "icon",
+    "icontype",
+    "titleForCourse",
+)
+
+
+# Вложенные уровни каталога, которые можно запросить через include.
+# Каждый следующий уровень включает предыдущие, кроме info.
+CATALOG_INCLUDES = ("info", "sections", "lessons", "descriptions")
+
+
+def catalog_projection(include: Optional[str] = None, fields: Optional[str] = None):
+    """Разобрать параметры include и fields списка курсов.
+
+    Возвращает кортежи уровней и полей курса в каноническом порядке.
+    Неизвестные значения приводят к ValueError.
+    """
+    requested = {item.strip() for item in (include or "").split(",") if item.strip()}
+    unknown = requested - set(CATALOG_INCLUDES)
+    if unknown:
+        raise ValueError(f"Неизвестные значения include: {', '.join(sorted(unknown))}")
+    if "descriptions" in requested:
+        requested.add("lessons")
+    if "lessons" in requested:
+        requested.add("sections")
+
+    if fields is None:
+        columns = set(COURSE_COLUMNS)
+    else:
+        columns = {item.strip() for item in fields.split(",") if item.strip()}
+        unknown = columns - set(COURSE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Неизвестные поля курса: {', '.join(sorted(unknown))}")
+        columns.add("id")
+
+    return (
+        tuple(level for level in CATALOG_INCLUDES if level in requested),
+        tuple(column for column in COURSE_COLUMNS if column in columns),
+    )
+
+
+def _catalog_options(include: tuple, fields: tuple):
+    # title и id нужны для курсора следующей страницы, даже если их не запросили
+    columns = {"id", "title", *fields}
+    options = [load_only(*(getattr(Course, column) for column in columns))]
+    if "info" in include:
+        options.append(selectinload(Course.info))
+    if "lessons" in include:
+        lessons = selectinload(Course.sections).selectinload(Section.content)
+        if "descriptions" in include:
+            lessons = lessons.undefer(Lesson.description)
+        options.append(lessons)
+    elif "sections" in include:
+        options.append(selectinload(Course.sections))
+    return options
+
+
+def _lesson_summary(lesson: Lesson, include: tuple):
+    data = {"id": lesson.id, "name": lesson.name, "passing": lesson.passing}
+    if "descriptions" in include:
+        data["description"] = lesson.description
+    return data
+
+
+def _course_summary(course: Course, include: tuple, fields: tuple):
+    data = {column: getattr(course, column) for column in fields}
+    if "info" in include:
+        data["info"] = [
+            {"id": info.id, "title": info.title, "subtitle": info.subtitle}
+            for info in course.info
+        ]
+    if "sections" in include:
+        data["sections"] = []
+        for section in course.sections:
+            section_data = {"id": section.id, "name": section.name}
+            if "lessons" in include:
+                section_data["content"] = [
+                    _lesson_summary(lesson, include) for lesson in section.content
+                ]
+            data["sections"].append(section_data)
+    return data
+
+
+def catalog_projection_key(include: tuple, fields: tuple):
+    """Строковый ключ проекции каталога (для кеша и ETag)"""
+    return f"{'+'.join(include)};{'+'.join(fields)}"
+
+
+def _courses_after(title: Optional[str], course_id: str):
+    # Курсы упорядочены по (title, id); NULL в title SQLite ставит первыми
+    if title is None:
+        return or_(
+            and_(Course.title.is_(None), Course.id > course_id),
+            Course.title.is_not(None),
+        )
+    return tuple_(Course.title, Course.id) > tuple_(title, course_id)
+
+
+def get_catalog_page_json(
+    db: Session,
+    include: tuple,
+    fields: tuple,
+    after: Optional[list],
+    limit: int,
+    version,
+):
+    """Страница каталога курсов в заданной проекции в виде готового JSON.
+
+    Курсы упорядочены по названию и ID; after - ключ (title, id) последнего
+    курса предыдущей страницы. Возвращает JSON и курсор следующей страницы
+    (None для последней). Загружаются только запрошенные поля и уровни
+    вложенности; результат берется из кеша, если он загружен для той же
+    версии каталога version.
+    """
+
+    def load():
+        query = db.query(Course).options(*_catalog_options(include, fields))
+        if after is not None:
+            query = query.filter(_courses_after(*after))
+        # Лишняя запись показывает, есть ли следующая страница
+        courses = query.order_by(Course.title, Course.id).limit(limit + 1).all()
+        next_cursor = None
+        if len(courses) > limit:
+            courses = courses[:limit]
+            next_cursor = encode_cursor(courses[-1].title, courses[-1].id)
+        data = json.dumps(
+            [_course_summary(course, include, fields) for course in courses],
+            ensure_ascii=False,
+        ).encode()
+        return data, next_cursor
+
+    key = f"{catalog_projection_key(include, fields)};{after};{limit}"
+    return catalog_cache.get_catalog_page(key, version, load)
+
+
+def write_course_trees(db: Session, courses: list):
+    """Массово создать курсы вместе с info, разделами и уроками.
+
+    Каждая таблица дерева заполняется одним executemany, а все изменения
+    фиксируются одним commit. Курсы передаются словарями в формате
+    CourseImport, ID курсов уже должны быть заполнены.
+    """
+    course_rows, info_rows, section_rows, lesson_rows, link_rows = [], [], [], [], []
+    lesson_ids = set()
+
+    for course in courses:
+        course_rows.append({column: course[column] for column in COURSE_COLUMNS})
+
+        for info_item in course.get("info") or []:
+            info_rows.append(
+                {
+                    "id": info_item["id"],
+                    "title": info_item["title"],
+                    "subtitle": info_item["subtitle"],
+                    "course_id": course["id"],
+                }
+            )
+
+        for section_item in course.get("sections") or []:
+            section_rows.append(
+                {
+                    "id": section_item["id"],
+                    "name": section_item["name"],
+                    "course_id": course["id"],
+                }
+            )
+            for lesson_item in section_item.get("content") or []:
+                # Урок может входить в несколько разделов, создается он один раз
+                if lesson_item["id"] not in lesson_ids:
+                    lesson_ids.add(lesson_item["id"])
+                    lesson_rows.append(
+                        {
+                            "id": lesson_item["id"],
+                            "name": lesson_item["name"],
+                            "passing": lesson_item["passing"],
+                            "description": lesson_item.get("description"),
+                        }
+                    )
+                link_rows.append(
+                    {"section_id": section_item["id"], "lesson_id": lesson_item["id"]}
+                )
+
+    for table, rows in (
+        (Course, course_rows),
+        (CourseInfo, info_rows),
+        (Section, section_rows),
+        (Lesson, lesson_rows),
+        (lesson_section, link_rows),
+    ):
+        if rows:
+            db.execute(insert(table), rows)
+
+    # Массовая вставка не вызывает события маппера, отмечаем курсы явно
+    course_ids = [course["id"] for course in courses]
+    courses_changed(db, course_ids)
+    course_lessons_changed(db, course_ids)
+    db.commit()
+
+
+def export_catalog_ndjson():
+    """Выгрузить каталог в NDJSON: по строке с полным деревом на курс.
+
+    Генератор с собственной сессией для StreamingResponse. Курсы читаются
+    пакетами по CATALOG_EXPORT_BATCH через yield_per, деревья пакета
+    подгружаются selectinload, поэтому в памяти одновременно находится
+    только один пакет, независимо от размера каталога.
+    """
+    db = SessionLocal()
+    try:
+        courses = (
+            db.query(Course)
+            .options(*course_tree_options())
+            .order_by(Course.id)
+            .yield_per(settings.CATALOG_EXPORT_BATCH)
+        )
+        for course in courses:
+            yield _course_adapter.dump_json(
+                _course_adapter.validate_python(course, from_attributes=True)
+            ) + b"\n"
+    finally:
+        db.close()
+
+
+class CatalogImportError(Exception):
+    """Ошибка импорта каталога; курсы из предыдущих пакетов уже сохранены"""
+
+    def __init__(self, status_code: int, message: str, imported: dict):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.imported = imported
+
+
+async def import_catalog_ndjson(db: AsyncSession, chunks: AsyncIterator[bytes]):
+    """Импортировать каталог из потока NDJSON (формат export_catalog_ndjson).
+
+    Строки разбираются по мере поступления, курсы записываются пакетами
+    через write_course_trees, как только в пакете набирается
+    CATALOG_IMPORT_BATCH_ROWS курсов и уроков. Каждый пакет фиксируется
+    отдельно. Возвращает число импортированных курсов и уроков.
+    """
+    imported = {"courses": 0, "lessons": 0}
+    batch, batch_lessons = [], 0
+    line_number = 0
+
+    async def write_batch():
+        nonlocal batch, batch_lessons
+        if not batch:
+            return
+        try:
+            await db.run_sync(write_course_trees, batch)
+        except IntegrityError:
+            await db.rollback()
+            raise CatalogImportError(
+                409,
+                "Курсы, разделы или уроки с такими ID уже существуют "
+                f"(пакет, заканчивающийся строкой {line_number})",
+                imported,
+            )
+        imported["courses"] += len(batch)
+        imported["lessons"] += batch_lessons
+        batch, batch_lessons = [], 0
+
+    async def add_line(line: bytes):
+        nonlocal batch_lessons
+        if not line.strip():
+            return
+        try:
+            course = CourseImport.model_validate_json(line).model_dump()
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            raise CatalogImportError(
+                400, f"Строка {line_number}: {location}: {error['msg']}", imported
+            )
+        if not course["id"]:
+            course["id"] = str(uuid.uuid4())
+        batch.append(course)
+        batch_lessons += sum(len(section["content"]) for section in course["sections"])
+        if len(batch) + batch_lessons >= settings.CATALOG_IMPORT_BATCH_ROWS:
+            await write_batch()
+
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            await add_line(line)
+    line_number += 1
+    await add_line(buffer)
+    await write_batch()
+    return imported
+
+
 def create_course(db: Session, course: CourseCreate):
     """Создать новый курс"""
     # Если ID не предоставлен, генерируем его
     if not course.id:
         course.id = str(uuid.uuid4())
 
-    db_course = Course(
-        id=course.id,
-        title=course.title,
-        subtitle=course.subtitle,
-        type=course.type,
-        timetoendL=course.timetoendL,
-        color=course.color,
-        icon=course.icon,
-        icontype=course.icontype,
-        titleForCourse=course.titleForCourse,
-    )
-    db.add(db_course)
-    db.flush()  # Необходимо для получения ID курса
-
-    # Создаем информацию о курсе
-    for info_item in course.info:
-        db_info = CourseInfo(
-            id=info_item.id,
-            title=info_item.title,
-            subtitle=info_item.subtitle,
-            course_id=db_course.id,
-        )
-        db.add(db_info)
-
-    # Создаем разделы курса
-    for section_item in course.sections:
-        db_section = Section(
-            id=section_item.id,
-            name=section_item.name,
-            course_id=db_course.id,
-        )
-        db.add(db_section)
-
-    db.commit()
-    db.refresh(db_course)
-    return db_course
+    write_course_trees(db, [course.model_dump()])
+    return get_course_tree(db, course.id)
 
 
 def update_course(db: Session, course_id: str, course: CourseUpdate):
@@ -86,40 +408,25 @@ def update_course(db: Session, course_id: str, course: CourseUpdate):
     db_course.titleForCourse = course.titleForCourse
 
     db.commit()
-    db.refresh(db_course)
-    return db_course
+    return get_course_tree(db, course_id)
 
 
 def delete_course(db: Session, course_id: str):
-    """Удалить курс"""
+    """Удалить курс.
+
+    Возвращает SHA-256 файлов изображения курса: после коммита их передают
+    в collect_garbage вне цикла событий.
+    """
     db_course = db.query(Course).filter(Course.id == course_id).first()
     if not db_course:
         raise HTTPException(status_code=404, detail="Курс не найден")
 
+    # Записи на курс удаляются в той же транзакции, что и сам курс
+    remove_enrollments(db, course_id=course_id)
     db.delete(db_course)
+    released = remove_image_variants(db, "course", course_id)
     db.commit()
-    return {"detail": f"Курс с ID {course_id} успешно удален"}
-
-
-async def save_course_image(course_id: str, file: UploadFile):
-    """Сохранить изображение курса"""
-    # Создаем директорию для изображений курса
-    COURSE_IMG_DIR = Path(__file__).resolve().parent.parent / "CourseImg"
-    course_dir = COURSE_IMG_DIR / str(course_id)
-    course_dir.mkdir(exist_ok=True, parents=True)
-
-    # Получаем расширение файла
-    file_extension = os.path.splitext(file.filename or "")[1]
-    file_name = f"{uuid.uuid4()}{file_extension}"
-    file_path = course_dir / file_name
-
-    # Сохраняем файл
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Возвращаем путь к файлу относительно корня приложения
-    relative_path = f"CourseImg/{course_id}/{file_name}"
-    return {"path": relative_path}
+    return released
 
 
 def create_course_info(db: Session, course_id: str, info: CourseInfoCreate):
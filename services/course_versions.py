@@ -0,0 +1,140 @@
+from datetime import datetime
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, object_session
+
+from models.course import (
+    Course,
+    CourseInfo,
+    CourseVersion,
+    Lesson,
+    Section,
+    lesson_section,
+)
+from services import catalog_cache
+
+# Отслеживание изменений курсов. Любое изменение курса, его info, разделов
+# и уроков увеличивает версию курса в той же транзакции и сбрасывает его
+# JSON в кеше каталога. Версии служат ETag для условных GET.
+_SESSION_KEY = "changed_courses"
+
+
+def courses_changed(db, course_ids=None):
+    """Отметить изменение курсов course_ids (None - всех) в текущей транзакции.
+
+    Принимает как Session, так и AsyncSession.
+    """
+    session = getattr(db, "sync_session", db)
+    changed = session.info.get(_SESSION_KEY, set())
+    if course_ids is None or changed is None:
+        session.info[_SESSION_KEY] = None
+    else:
+        session.info[_SESSION_KEY] = changed | set(course_ids)
+    catalog_cache.invalidate_courses(session, course_ids)
+
+
+def bump_course_versions(db: Session, course_ids=None):
+    """Увеличить версии курсов course_ids (None - всех)"""
+    now = datetime.utcnow()
+    if course_ids is None:
+        db.execute(
+            update(CourseVersion).values(
+                version=CourseVersion.version + 1, updated_at=now
+            )
+        )
+        return
+
+    stmt = sqlite_insert(CourseVersion)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CourseVersion.course_id],
+        set_={"version": CourseVersion.version + 1, "updated_at": now},
+    )
+    db.execute(
+        stmt,
+        [
+            {"course_id": course_id, "version": 1, "updated_at": now}
+            for course_id in sorted(course_ids)
+        ],
+    )
+
+
+def get_course_version(db: Session, course_id: str):
+    """Версия и время изменения курса: (0, None), если курс не менялся"""
+    row = db.execute(
+        select(CourseVersion.version, CourseVersion.updated_at).where(
+            CourseVersion.course_id == course_id
+        )
+    ).first()
+    return tuple(row) if row is not None else (0, None)
+
+
+def get_catalog_version(db: Session):
+    """Версия каталога и время последнего изменения любого курса.
+
+    Версии курсов только растут, поэтому их сумма меняется при любом
+    изменении каталога, включая удаление курса.
+    """
+    total, updated_at = db.execute(
+        select(
+            func.coalesce(func.sum(CourseVersion.version), 0),
+            func.max(CourseVersion.updated_at),
+        )
+    ).one()
+    return total, updated_at
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_changed_courses(session: Session):
+    # События маппера срабатывают при сбросе, поэтому сбрасываем до подсчета
+    session.flush()
+    if _SESSION_KEY in session.info:
+        course_ids = session.info.pop(_SESSION_KEY)
+        bump_course_versions(session, course_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_courses(session: Session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def affected_course_ids(connection, target):
+    """Курсы, которых касается изменение курса, info, раздела или урока target"""
+    if isinstance(target, Course):
+        return {target.id}
+
+    if isinstance(target, (CourseInfo, Section)):
+        # Учитываем и прежний курс, если запись перенесли в другой
+        history = inspect(target).attrs.course_id.history
+        return {
+            course_id
+            for course_id in (target.course_id, *history.deleted)
+            if course_id is not None
+        }
+
+    course_ids = set(
+        connection.execute(
+            select(Section.course_id)
+            .join(lesson_section, lesson_section.c.section_id == Section.id)
+            .where(lesson_section.c.lesson_id == target.id)
+        ).scalars()
+    )
+    # Связи нового урока еще не записаны, а связи удаленного уже удалены:
+    # берем разделы урока из загруженной коллекции и ее истории
+    history = inspect(target).attrs.sections.history
+    course_ids.update(section.course_id for section in history.sum())
+    course_ids.discard(None)
+    return course_ids
+
+
+def _track_target(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        courses_changed(session, affected_course_ids(connection, target))
+
+
+# Изменение состава уроков раздела помечает раздел измененным, поэтому
+# связи lesson_sections покрываются событиями Section
+for _model in (Course, CourseInfo, Section, Lesson):
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event_name, _track_target)
@@ -0,0 +1,197 @@
+import asyncio
+import smtplib
+import uuid
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from database import SessionLocal
+from models.email_outbox import EmailOutbox
+
+# Статусы писем в очереди
+EMAIL_PENDING = "pending"
+EMAIL_SENDING = "sending"
+EMAIL_SENT = "sent"
+EMAIL_FAILED = "failed"
+
+# Если отправитель упал, захваченные им письма снова станут доступны
+CLAIM_LEASE = timedelta(minutes=5)
+
+_smtp: Optional[smtplib.SMTP] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+_sender_task: Optional[asyncio.Task] = None
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, body: str):
+    """Поставить письмо в очередь отправки и разбудить отправителя"""
+    db.add(EmailOutbox(to_email=to_email, subject=subject, body=body))
+    db.commit()
+    if _loop is not None and _wakeup is not None:
+        # Может вызываться из потока пула, поэтому через call_soon_threadsafe
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def enqueue_verification_code(db: Session, to_email: str, code: str):
+    """Поставить в очередь письмо с кодом подтверждения"""
+    enqueue_email(
+        db, to_email, "Verification Code", f"Your verification code is: {code}"
+    )
+
+
+def _get_smtp():
+    """Получить открытое и авторизованное SMTP-соединение"""
+    global _smtp
+    if _smtp is None:
+        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30)
+        if settings.SMTP_STARTTLS:
+            server.starttls()
+        if settings.SMTP_USER:
+            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        _smtp = server
+    return _smtp
+
+
+def _close_smtp():
+    global _smtp
+    if _smtp is not None:
+        try:
+            _smtp.quit()
+        except Exception:
+            pass
+        _smtp = None
+
+
+def _send(message: EmailOutbox):
+    sender = settings.EMAIL_SENDER or settings.SMTP_USER
+    mime = MIMEMultipart()
+    mime["From"] = sender
+    mime["To"] = message.to_email
+    mime["Subject"] = message.subject
+    mime.attach(MIMEText(message.body, "plain"))
+    _get_smtp().sendmail(sender, message.to_email, mime.as_string())
+
+
+def _claim_batch(db: Session):
+    """Захватить пачку писем, готовых к отправке.
+
+    Захват выполняется одним UPDATE, поэтому несколько процессов
+    приложения не отправят одно письмо дважды.
+    """
+    now = datetime.utcnow()
+    claim_token = uuid.uuid4().hex
+    ready_ids = (
+        select(EmailOutbox.id)
+        .where(
+            or_(
+                and_(
+                    EmailOutbox.status == EMAIL_PENDING,
+                    EmailOutbox.next_attempt_at <= now,
+                ),
+                and_(
+                    EmailOutbox.status == EMAIL_SENDING,
+                    EmailOutbox.claimed_at < now - CLAIM_LEASE,
+                ),
+            )
+        )
+        .order_by(EmailOutbox.id)
+        .limit(settings.EMAIL_BATCH_SIZE)
+    )
+    db.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(ready_ids.scalar_subquery()))
+        .values(status=EMAIL_SENDING, claimed_by=claim_token, claimed_at=now)
+    )
+    db.commit()
+    return (
+        db.query(EmailOutbox)
+        .filter(EmailOutbox.claimed_by == claim_token)
+        .order_by(EmailOutbox.id)
+        .all()
+    )
+
+
+def _process_batch():
+    """Отправить одну пачку писем через общее SMTP-соединение.
+
+    Возвращает False, если отправлять было нечего.
+    """
+    db = SessionLocal()
+    try:
+        messages = _claim_batch(db)
+        if not messages:
+            return False
+
+        for message in messages:
+            try:
+                _send(message)
+                message.status = EMAIL_SENT
+                message.sent_at = datetime.utcnow()
+            except Exception as e:
+                print(f"Error sending email to {message.to_email}: {e}")
+                # Соединение могло оборваться, следующее письмо откроет новое
+                _close_smtp()
+                message.attempts += 1
+                message.last_error = str(e)
+                if message.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                    message.status = EMAIL_FAILED
+                else:
+                    message.status = EMAIL_PENDING
+                    message.next_attempt_at = datetime.utcnow() + timedelta(
+                        seconds=settings.EMAIL_RETRY_SECONDS
+                        * 2 ** (message.attempts - 1)
+                    )
+            message.claimed_by = None
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+async def _sender_loop():
+    while True:
+        try:
+            has_more = await run_in_threadpool(_process_batch)
+        except Exception as e:
+            print(f"Error in email sender: {e}")
+            has_more = False
+
+        if has_more:
+            continue
+
+        # Очередь пуста: закрываем соединение и ждем новых писем
+        await run_in_threadpool(_close_smtp)
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.EMAIL_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_email_sender():
+    """Запустить фоновую отправку писем из очереди"""
+    global _loop, _wakeup, _sender_task
+    if not settings.SMTP_USER:
+        print("SMTP_USER не задан: письма отправляются без авторизации на сервере")
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _sender_task = asyncio.create_task(_sender_loop())
+
+
+async def stop_email_sender():
+    """Остановить фоновую отправку писем"""
+    global _sender_task
+    if _sender_task is not None:
+        _sender_task.cancel()
+        try:
+            await _sender_task
+        except asyncio.CancelledError:
+            pass
+        _sender_task = None
+    await run_in_threadpool(_close_smtp)
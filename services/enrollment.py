@@ -0,0 +1,83 @@
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models.course import Course
+from models.user import User
+from models.user_course import user_course
+
+# Максимум ID пользователей в одном INSERT ... SELECT при массовой записи
+# (ограничение SQLite на число параметров запроса)
+ENROLL_CHUNK_SIZE = 5000
+
+
+def enroll_users(db: Session, course_id: str, user_ids: list):
+    """Записать пользователей user_ids на курс course_id.
+
+    Каждая пачка ID записывается одним INSERT ... SELECT, который заодно
+    отбрасывает несуществующих пользователей; повторная запись ничего не
+    меняет. Все пачки фиксируются одним commit. Возвращает число новых
+    записей, уже записанных и неизвестных пользователей.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    enrolled = 0
+    existing = 0
+    for start in range(0, len(user_ids), ENROLL_CHUNK_SIZE):
+        chunk = user_ids[start : start + ENROLL_CHUNK_SIZE]
+        existing += len(db.scalars(select(User.id).where(User.id.in_(chunk))).all())
+        result = db.execute(
+            sqlite_insert(user_course)
+            .from_select(
+                [user_course.c.user_id, user_course.c.course_id],
+                select(User.id, Course.id)
+                .join(Course, Course.id == course_id)
+                .where(User.id.in_(chunk)),
+            )
+            .on_conflict_do_nothing()
+        )
+        enrolled += result.rowcount
+    db.commit()
+    return {
+        "enrolled": enrolled,
+        "already_enrolled": existing - enrolled,
+        "unknown_users": len(user_ids) - existing,
+    }
+
+
+def unenroll_user(db: Session, user_id: int, course_id: str):
+    """Отписать пользователя от курса. False, если он не был записан.
+
+    Прогресс по урокам сохраняется и вернется при повторной записи.
+    """
+    result = db.execute(
+        delete(user_course).where(
+            user_course.c.user_id == user_id, user_course.c.course_id == course_id
+        )
+    )
+    db.commit()
+    return result.rowcount > 0
+
+
+def remove_enrollments(db: Session, user_id: int = None, course_id: str = None):
+    """Удалить записи пользователя или слушателей курса без commit.
+
+    Вызывается в транзакции удаления пользователя или курса, чтобы записи
+    удалялись вместе с ними.
+    """
+    query = delete(user_course)
+    if user_id is not None:
+        query = query.where(user_course.c.user_id == user_id)
+    if course_id is not None:
+        query = query.where(user_course.c.course_id == course_id)
+    db.execute(query)
+
+
+def get_user_courses(db: Session, user_id: int):
+    """Курсы, на которые записан пользователь, по первичному ключу user_courses"""
+    return (
+        db.query(Course)
+        .join(user_course, user_course.c.course_id == Course.id)
+        .filter(user_course.c.user_id == user_id)
+        .order_by(Course.title, Course.id)
+        .all()
+    )
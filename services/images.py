@@ -0,0 +1,271 @@
+import asyncio
+import os
+import shutil
+import uuid
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.image import ImageVariant
+from services.media import collect_garbage, file_sha256, media_url, publish_file
+from services.uploads import UPLOAD_SPOOL_DIR
+
+# Обработка загруженных изображений: файл декодируется в отдельном
+# процессе, уменьшается до ширин IMAGE_VARIANT_WIDTHS (без увеличения) и
+# сохраняется в WebP и JPEG. Оригинал не хранится, варианты лежат в
+# хранилище медиа (services.media) под SHA-256 своего содержимого.
+IMAGE_FORMATS = (("webp", "WEBP", ".webp"), ("jpeg", "JPEG", ".jpg"))
+SVG_CONTENT_TYPE = "image/svg+xml"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class ImageProcessingError(Exception):
+    """Файл не является изображением или слишком велик"""
+
+
+def get_image_executor():
+    """Получить пул процессов обработки изображений (создается при первом вызове)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _executor
+
+
+def shutdown_image_executor():
+    """Остановить пул процессов при завершении приложения"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _variant_widths(width: int, widths: list):
+    targets = sorted(target for target in widths if target < width)
+    if width <= max(widths):
+        targets.append(width)
+    return targets
+
+
+def render_variants(
+    source: str,
+    target_dir: str,
+    widths: list,
+    max_pixels: int,
+    webp_quality: int,
+    jpeg_quality: int,
+):
+    """Сохранить варианты изображения source в target_dir (в процессе пула).
+
+    Изображения больше max_pixels отклоняются до декодирования. JPEG
+    декодируется сразу в уменьшенном масштабе (draft), ориентация берется
+    из EXIF. Возвращает описания вариантов с путями и SHA-256 файлов;
+    ValueError, если файл не удалось прочитать.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(source) as image:
+                image.draft("RGB", (max(widths), max(widths)))
+                image = ImageOps.exif_transpose(image)
+                has_alpha = image.mode in ("RGBA", "LA") or (
+                    image.mode == "P" and "transparency" in image.info
+                )
+                image = image.convert("RGBA" if has_alpha else "RGB")
+    except (
+        UnidentifiedImageError,
+        Image.DecompressionBombError,
+        Image.DecompressionBombWarning,
+        OSError,
+        SyntaxError,
+    ) as e:
+        raise ValueError(f"Не удалось прочитать изображение: {e}")
+
+    os.makedirs(target_dir, exist_ok=True)
+    variants = []
+    # От большего варианта к меньшему: каждый уменьшается из предыдущего
+    for width in reversed(_variant_widths(image.width, widths)):
+        height = max(1, round(image.height * width / image.width))
+        if width != image.width:
+            image = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for name, pil_format, extension in IMAGE_FORMATS:
+            variant = image
+            if pil_format == "JPEG" and has_alpha:
+                variant = Image.new("RGB", image.size, "white")
+                variant.paste(image, mask=image.getchannel("A"))
+            path = os.path.join(target_dir, f"{width}w{extension}")
+            variant.save(
+                path,
+                pil_format,
+                quality=webp_quality if pil_format == "WEBP" else jpeg_quality,
+                **({"optimize": True, "progressive": True} if name == "jpeg" else {}),
+            )
+            variants.append(
+                {
+                    "width": width,
+                    "height": height,
+                    "format": name,
+                    "extension": extension,
+                    "path": path,
+                    "sha256": file_sha256(path),
+                    "size": os.path.getsize(path),
+                }
+            )
+    return variants
+
+
+async def render_image(source: str, content_type: Optional[str]):
+    """Подготовить варианты изображения source во временном каталоге.
+
+    SVG используется как есть. Варианты попадают в хранилище медиа через
+    replace_image_variants и publish_image_variants, временный каталог
+    удаляет discard_rendered. Файл source не удаляется.
+    """
+    target_dir = UPLOAD_SPOOL_DIR / f"image-{uuid.uuid4().hex}"
+    try:
+        if content_type == SVG_CONTENT_TYPE:
+            target_dir.mkdir(parents=True)
+            path = target_dir / "image.svg"
+            await run_in_threadpool(shutil.copyfile, source, path)
+            variants = [
+                {
+                    "width": None,
+                    "height": None,
+                    "format": "svg",
+                    "extension": ".svg",
+                    "path": str(path),
+                    "sha256": await run_in_threadpool(file_sha256, path),
+                    "size": path.stat().st_size,
+                }
+            ]
+        else:
+            loop = asyncio.get_running_loop()
+            variants = await loop.run_in_executor(
+                get_image_executor(),
+                render_variants,
+                source,
+                str(target_dir),
+                settings.IMAGE_VARIANT_WIDTHS,
+                settings.IMAGE_MAX_PIXELS,
+                settings.IMAGE_WEBP_QUALITY,
+                settings.IMAGE_JPEG_QUALITY,
+            )
+    except BaseException as e:
+        # Любой сбой (в том числе сломанный пул процессов или отмена
+        # запроса) не должен оставлять частично записанные варианты
+        shutil.rmtree(target_dir, ignore_errors=True)
+        if isinstance(e, ValueError):
+            raise ImageProcessingError(str(e))
+        raise
+
+    for variant in variants:
+        variant["url"] = media_url(variant["sha256"], variant.pop("extension"))
+    return variants
+
+
+def public_variants(variants: list):
+    """Описание вариантов для ответа API"""
+    return [
+        {key: variant[key] for key in ("width", "height", "format", "url")}
+        for variant in variants
+    ]
+
+
+def default_variant_url(variants: list):
+    """URL варианта для icon/img: наибольший WebP не шире IMAGE_DEFAULT_WIDTH"""
+    candidates = [variant for variant in variants if variant["format"] != "jpeg"]
+    fitting = [
+        variant
+        for variant in candidates
+        if (variant["width"] or 0) <= settings.IMAGE_DEFAULT_WIDTH
+    ]
+    if fitting:
+        return max(fitting, key=lambda variant: variant["width"] or 0)["url"]
+    return min(candidates, key=lambda variant: variant["width"])["url"]
+
+
+def replace_image_variants(db: Session, owner_type: str, owner_id: str, variants: list):
+    """Заменить варианты изображения владельца, не фиксируя транзакцию.
+
+    Ссылки на файлы хранилища пересчитываются триггерами image_variants.
+    Возвращает SHA-256 файлов прежних вариантов - кандидатов в мусор.
+    """
+    released = remove_image_variants(db, owner_type, owner_id)
+    db.execute(
+        insert(ImageVariant),
+        [
+            {
+                "owner_type": owner_type,
+                "owner_id": str(owner_id),
+                **{
+                    key: variant[key]
+                    for key in ("width", "height", "format", "url", "sha256", "size")
+                },
+            }
+            for variant in variants
+        ],
+    )
+    return released
+
+
+def remove_image_variants(db: Session, owner_type: str, owner_id: str):
+    """Удалить варианты изображения владельца, не фиксируя транзакцию.
+
+    Возвращает SHA-256 их файлов для collect_garbage после коммита.
+    """
+    owner = (
+        ImageVariant.owner_type == owner_type,
+        ImageVariant.owner_id == str(owner_id),
+    )
+    released = list(db.scalars(select(ImageVariant.sha256).where(*owner)))
+    db.execute(delete(ImageVariant).where(*owner))
+    return released
+
+
+def get_image_variants(db: Session, owner_type: str, owner_id: str):
+    """Варианты изображения владельца, от меньшего к большему"""
+    return [
+        {
+            "width": variant.width,
+            "height": variant.height,
+            "format": variant.format,
+            "url": variant.url,
+        }
+        for variant in db.scalars(
+            select(ImageVariant)
+            .where(
+                ImageVariant.owner_type == owner_type,
+                ImageVariant.owner_id == str(owner_id),
+            )
+            .order_by(ImageVariant.width, ImageVariant.format)
+        )
+    ]
+
+
+def _publish(variants: list, released: list):
+    try:
+        for variant in variants:
+            publish_file(variant["path"], variant["url"])
+    finally:
+        discard_rendered(variants)
+    collect_garbage(released)
+
+
+async def publish_image_variants(variants: list, released: list = ()):
+    """После коммита: поместить файлы вариантов в хранилище и удалить
+    файлы прежних вариантов, на которые больше нет ссылок"""
+    await run_in_threadpool(_publish, variants, list(released))
+
+
+def discard_rendered(variants: list):
+    """Удалить временный каталог подготовленных вариантов"""
+    for directory in {Path(variant["path"]).parent for variant in variants}:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import delete, select
+
+from config import settings
+from database import SessionLocal
+from models.image import MediaBlob
+
+# Хранилище медиа с адресацией по содержимому: файл лежит по пути
+# media/<первые 2 символа SHA-256>/<SHA-256><расширение>. Одинаковые файлы
+# хранятся один раз, содержимое по URL никогда не меняется, поэтому URL
+# можно кешировать бессрочно.
+#
+# Порядок операций исключает потерю файла при одновременной сборке мусора:
+# ссылка на файл фиксируется в БД до того, как файл помещается в
+# хранилище (publish_file), а сборщик удаляет файл, удерживая блокировку
+# записи БД до удаления строки.
+MEDIA_URL_PREFIX = "media"
+MEDIA_DIR = Path(settings.MEDIA_DIR)
+MEDIA_DIR.mkdir(exist_ok=True, parents=True)
+
+
+def file_sha256(path):
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def media_url(sha256: str, extension: str):
+    """URL файла с содержимым sha256 относительно корня приложения"""
+    return f"{MEDIA_URL_PREFIX}/{sha256[:2]}/{sha256}{extension}"
+
+
+def media_path(url: str):
+    """Путь к файлу хранилища по его URL (media/...)"""
+    return MEDIA_DIR / url.lstrip("/").removeprefix(f"{MEDIA_URL_PREFIX}/")
+
+
+def publish_file(source, url: str):
+    """Поместить файл source в хранилище по url, если его там еще нет.
+
+    Вызывается после коммита ссылки на файл. source перемещается или,
+    если такой файл уже есть, удаляется.
+    """
+    target = media_path(url)
+    if target.exists():
+        os.remove(source)
+        return
+    target.parent.mkdir(exist_ok=True, parents=True)
+    tmp_path = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    shutil.move(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+def collect_garbage(sha256s: Optional[list] = None):
+    """Удалить файлы хранилища без ссылок (из sha256s или все).
+
+    Каждый файл удаляется в своей транзакции: строка удаляется, только
+    если ссылок по-прежнему нет, а файл - до коммита, пока никто не может
+    добавить ссылку. Возвращает число удаленных файлов.
+    """
+    db = SessionLocal()
+    removed = 0
+    try:
+        query = select(MediaBlob.sha256).where(MediaBlob.ref_count <= 0)
+        if sha256s is not None:
+            query = query.where(MediaBlob.sha256.in_(sha256s))
+        for sha256 in db.scalars(query).all():
+            url = db.scalar(
+                delete(MediaBlob)
+                .where(MediaBlob.sha256 == sha256, MediaBlob.ref_count <= 0)
+                .returning(MediaBlob.url)
+            )
+            if url is not None:
+                try:
+                    media_path(url).unlink()
+                except FileNotFoundError:
+                    pass
+                removed += 1
+            db.commit()
+    finally:
+        db.close()
+    return removed
@@ -0,0 +1,39 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import Request
+
+# Курсорная (keyset) пагинация: курсор - закодированные значения ключа
+# сортировки последней записи страницы. Следующая страница выбирается
+# условием "ключ больше курсора" по индексу, без OFFSET, поэтому время
+# ответа не зависит от номера страницы.
+
+
+def encode_cursor(*values):
+    """Закодировать ключ последней записи страницы в непрозрачный курсор"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int):
+    """Раскодировать курсор из size значений. Некорректный курсор - ValueError.
+
+    Типы значений проверяет вызывающий код.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Некорректный курсор")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Некорректный курсор")
+    return values
+
+
+def next_page_headers(request: Request, next_cursor: Optional[str], limit: int):
+    """Заголовки со ссылкой на следующую страницу (пусто для последней)"""
+    if next_cursor is None:
+        return {}
+    next_url = request.url.include_query_params(cursor=next_cursor, limit=limit)
+    return {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
@@ -0,0 +1,57 @@
+import json
+import os
+from pathlib import Path
+
+from config import settings
+
+# Кеш результатов разбора PDF: один JSON-файл на содержимое и движок.
+# Время изменения файла служит отметкой последнего использования (LRU).
+PDF_CACHE_DIR = Path(settings.PDF_CACHE_DIR)
+PDF_CACHE_DIR.mkdir(exist_ok=True, parents=True)
+
+
+def _entry_path(digest: str, backend: str):
+    return PDF_CACHE_DIR / f"{digest}_{backend}.json"
+
+
+def load_entry(digest: str, backend: str):
+    """Получить запись кеша или None, если ее нет"""
+    path = _entry_path(digest, backend)
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            entry = json.load(f)
+        os.utime(path)  # Отмечаем использование для LRU
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return entry
+
+
+def store_entry(digest: str, backend: str, result: dict, course_id: str):
+    """Сохранить результат разбора и ID созданного по нему курса"""
+    path = _entry_path(digest, backend)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump({"result": result, "course_id": course_id}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    _evict()
+
+
+def _evict():
+    """Удалить давно не использованные записи сверх лимита размера кеша"""
+    entries = []
+    for path in PDF_CACHE_DIR.glob("*.json"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= settings.PDF_CACHE_MAX_BYTES:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
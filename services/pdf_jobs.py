@@ -0,0 +1,363 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from database import SessionLocal
+from models.course import Course
+from services import pdf_cache
+from services.pdf_processor import (
+    CourseOutlineParser,
+    count_pages,
+    extract_pages,
+    renew_course_ids,
+    save_parsed_course,
+    split_page_ranges,
+)
+from services.uploads import remove_spooled
+
+# Статусы задач обработки PDF
+JOB_PROCESSING = "processing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+_executor: Optional[ProcessPoolExecutor] = None
+# Задачи, которые сейчас выполняет этот процесс
+_jobs: Dict[str, dict] = {}
+
+# Все задачи хранятся на диске: статус и результат доступны любому
+# процессу-обработчику, а не только тому, который принял загрузку
+PDF_JOBS_DIR = Path(settings.PDF_JOBS_DIR)
+PDF_JOBS_DIR.mkdir(exist_ok=True, parents=True)
+
+
+class PdfQueueFullError(Exception):
+    """Очередь обработки PDF заполнена"""
+
+
+class PdfCommitInProgressError(Exception):
+    """Курс задачи уже сохраняется другим запросом"""
+
+
+def get_executor():
+    """Получить пул процессов для разбора PDF (создается при первом вызове)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.PDF_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    """Остановить пул процессов при завершении приложения"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _prune_jobs():
+    """Удалить завершенные задачи и их отметки о сохранении с истекшим сроком"""
+    deadline = time.time() - settings.PDF_JOB_TTL_SECONDS
+    for path in PDF_JOBS_DIR.iterdir():
+        try:
+            if path.stat().st_mtime < deadline:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _store_job(job: dict):
+    path = PDF_JOBS_DIR / f"{job['job_id']}.json"
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(
+            {key: value for key, value in job.items() if key != "task"},
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp_path, path)
+
+
+def _load_job(job_id: str):
+    if not job_id.isalnum():
+        return None
+    try:
+        with (PDF_JOBS_DIR / f"{job_id}.json").open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _process_alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _claim_stale(path: Path):
+    """Отметка о сохранении осталась от упавшего или зависшего процесса.
+
+    Возвращает прочитанное содержимое отметки, если ее можно занять заново,
+    иначе None. Отметка без содержимого (процесс упал сразу после создания)
+    считается устаревшей по времени изменения файла.
+    """
+    try:
+        raw = path.read_bytes()
+        created = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    try:
+        claim = json.loads(raw)
+        pid, created = int(claim["pid"]), float(claim["created"])
+    except (ValueError, KeyError, TypeError):
+        pid = None
+    expired = time.time() - created > settings.PDF_COMMIT_CLAIM_TIMEOUT_SECONDS
+    if expired or (pid is not None and not _process_alive(pid)):
+        return raw
+    return None
+
+
+def _drop_stale_claim(path: Path, stale: bytes):
+    """Убрать устаревшую отметку, не задев свежую, созданную другим процессом.
+
+    Отметка сначала атомарно переименовывается. Если под ее именем уже
+    оказалась чужая свежая отметка, она возвращается на место через link,
+    который, как и O_EXCL, не перезаписывает существующий файл.
+    """
+    moved = path.with_name(f"{path.name}.{uuid.uuid4().hex}.stale")
+    try:
+        os.rename(path, moved)
+    except FileNotFoundError:
+        return
+    try:
+        if moved.read_bytes() != stale:
+            try:
+                os.link(moved, path)
+            except FileExistsError:
+                pass
+    finally:
+        moved.unlink(missing_ok=True)
+
+
+def _claim_commit(job_id: str):
+    """Занять сохранение курса задачи: True, если его еще никто не занял.
+
+    Файл создается атомарно (O_EXCL), поэтому из нескольких одновременных
+    запросов, в том числе из разных процессов, сохранение получает один.
+    В файл пишутся PID и время захвата: отметку процесса, который умер или
+    держит ее дольше PDF_COMMIT_CLAIM_TIMEOUT_SECONDS, можно занять заново.
+    """
+    path = PDF_JOBS_DIR / f"{job_id}.commit"
+    claim = json.dumps({"pid": os.getpid(), "created": time.time()}).encode()
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            stale = _claim_stale(path)
+            if stale is None:
+                return False
+            _drop_stale_claim(path, stale)
+            continue
+        try:
+            os.write(fd, claim)
+        finally:
+            os.close(fd)
+        return True
+    return False
+
+
+def _release_commit(job_id: str):
+    (PDF_JOBS_DIR / f"{job_id}.commit").unlink(missing_ok=True)
+
+
+def _pending_count():
+    return len(_jobs)
+
+
+def _save_result(result: dict):
+    db = SessionLocal()
+    try:
+        return save_parsed_course(db, result)
+    finally:
+        db.close()
+
+
+def _course_exists(course_id: str):
+    db = SessionLocal()
+    try:
+        return db.query(Course.id).filter(Course.id == course_id).first() is not None
+    finally:
+        db.close()
+
+
+async def _parse_pdf(backend: str, path: str, course_title: str):
+    """Разобрать PDF, передавая страницы парсеру по мере извлечения"""
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    page_count = await loop.run_in_executor(executor, count_pages, backend, path)
+    parser = CourseOutlineParser()
+
+    # Ограничиваем число диапазонов в работе, чтобы не копить текст в памяти
+    in_flight = deque()
+    for start, end in split_page_ranges(page_count, settings.PDF_PAGES_PER_CHUNK):
+        in_flight.append(
+            loop.run_in_executor(executor, extract_pages, backend, path, start, end)
+        )
+        if len(in_flight) > settings.PDF_WORKERS:
+            await run_in_threadpool(parser.feed_pages, await in_flight.popleft())
+    while in_flight:
+        await run_in_threadpool(parser.feed_pages, await in_flight.popleft())
+
+    return parser.finish(course_title)
+
+
+async def _run_job(job: dict, path: str, course_title: str):
+    backend = job["backend"]
+    digest = job["digest"]
+    try:
+        entry = await run_in_threadpool(pdf_cache.load_entry, digest, backend)
+
+        if entry is not None:
+            job["cached"] = True
+            course_id = entry["course_id"]
+            if (
+                job["reuse_existing"]
+                and course_id is not None
+                and await run_in_threadpool(_course_exists, course_id)
+            ):
+                # Такой PDF уже импортирован: возвращаем существующий курс
+                job["course_id"] = course_id
+                job["result"] = entry["result"]
+                job["status"] = JOB_COMPLETED
+                return
+            result = renew_course_ids(entry["result"], course_title)
+        else:
+            result = await _parse_pdf(backend, path, course_title)
+
+        job["result"] = result
+        if not job["dry_run"]:
+            job["course_id"] = await run_in_threadpool(_save_result, result)
+        if entry is None or job["course_id"] is not None:
+            await run_in_threadpool(
+                pdf_cache.store_entry, digest, backend, result, job["course_id"]
+            )
+        job["status"] = JOB_COMPLETED
+    except Exception as e:
+        print(f"Ошибка при обработке PDF {job['filename']}: {e}")
+        job["error"] = str(e)
+        job["status"] = JOB_FAILED
+    finally:
+        remove_spooled(path)
+        job["finished_at"] = time.time()
+        job.pop("task", None)
+        await run_in_threadpool(_store_job, job)
+        _jobs.pop(job["job_id"], None)
+
+
+def submit_pdf_job(
+    path: str,
+    digest: str,
+    filename: str,
+    course_title: str,
+    backend: str,
+    reuse_existing: bool = False,
+    dry_run: bool = True,
+):
+    """Поставить PDF в очередь на разбор и вернуть описание задачи.
+
+    path - временный файл загрузки, задача удаляет его по завершении.
+    В режиме dry_run курс только разбирается, а в базу данных
+    сохраняется позже через commit_job.
+    """
+    _prune_jobs()
+    if _pending_count() >= settings.PDF_QUEUE_SIZE:
+        raise PdfQueueFullError()
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "filename": filename,
+        "backend": backend,
+        "dry_run": dry_run,
+        "reuse_existing": reuse_existing,
+        "status": JOB_PROCESSING,
+        "cached": False,
+        "digest": digest,
+        "course_id": None,
+        "error": None,
+        "result": None,
+        "created_at": time.time(),
+        "finished_at": None,
+    }
+    _jobs[job_id] = job
+    _store_job(job)
+    # Храним ссылку на задачу, чтобы ее не удалил сборщик мусора
+    job["task"] = asyncio.create_task(_run_job(job, path, course_title))
+    return job
+
+
+def commit_job(db: Session, job: dict):
+    """Сохранить в базе данных курс, разобранный задачей в режиме dry_run.
+
+    Повторный вызов не создает дубликат, а возвращает уже созданный курс.
+    Если курс в этот момент сохраняет другой запрос, PdfCommitInProgressError.
+    """
+    job_id = job["job_id"]
+    if job["course_id"] is not None:
+        return job["course_id"]
+
+    if not _claim_commit(job_id):
+        job = _load_job(job_id) or job
+        if job["course_id"] is None:
+            raise PdfCommitInProgressError()
+        return job["course_id"]
+
+    try:
+        # Задачу могли сохранить до того, как мы ее прочитали
+        job = _load_job(job_id) or job
+        if job["course_id"] is None:
+            job["course_id"] = save_parsed_course(db, job["result"])
+            _store_job(job)
+            pdf_cache.store_entry(
+                job["digest"], job["backend"], job["result"], job["course_id"]
+            )
+    except BaseException:
+        if job["course_id"] is None:
+            _release_commit(job_id)
+        raise
+    return job["course_id"]
+
+
+def get_job(job_id: str):
+    """Получить задачу по ID, в том числе принятую другим процессом"""
+    job = _jobs.get(job_id)
+    if job is None:
+        job = _load_job(job_id)
+    return job
+
+
+def job_status(job: dict):
+    """Публичное представление статуса задачи"""
+    return {
+        "job_id": job["job_id"],
+        "filename": job["filename"],
+        "backend": job["backend"],
+        "dry_run": job["dry_run"],
+        "status": job["status"],
+        "cached": job["cached"],
+        "course_id": job["course_id"],
+        "error": job["error"],
+    }
@@ -0,0 +1,223 @@
+import re
+import uuid
+from datetime import datetime
+
+import pdfplumber
+import pypdfium2 as pdfium
+from sqlalchemy.orm import Session
+
+from services.course import write_course_trees
+
+# Паттерны строк-заголовков разделов и подразделов
+MAIN_SECTION_LINE = re.compile(
+    r"^\s*(\d{1,3})[\.\-]?\s+([А-ЯЁA-Z\s][А-ЯЁA-Z0-9\s\-]*)$"
+)
+SUB_SECTION_LINE = re.compile(r"^\s*(\d+(?:\.\d+)+)[\.\-]?\s+(.+)$")
+
+
+# Движки открывают PDF по пути к файлу, а не из байтов в памяти:
+# так каждый процесс пула читает с диска только нужные ему страницы.
+def _pdfplumber_page_count(path: str):
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _pdfplumber_extract(path: str, start: int, end: int):
+    with pdfplumber.open(path) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages[start:end]]
+
+
+def _pypdfium2_page_count(path: str):
+    pdf = pdfium.PdfDocument(path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _pypdfium2_extract(path: str, start: int, end: int):
+    pdf = pdfium.PdfDocument(path)
+    try:
+        page_texts = []
+        for index in range(start, end):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            # pdfium разделяет строки через \r\n, а паттерны рассчитаны на \n
+            page_texts.append(textpage.get_text_bounded().replace("\r\n", "\n"))
+            textpage.close()
+            page.close()
+        return page_texts
+    finally:
+        pdf.close()
+
+
+# Доступные движки извлечения текста: (подсчет страниц, извлечение диапазона)
+PDF_BACKENDS = {
+    "pdfplumber": (_pdfplumber_page_count, _pdfplumber_extract),
+    "pypdfium2": (_pypdfium2_page_count, _pypdfium2_extract),
+}
+
+
+def count_pages(backend: str, path: str):
+    """Получить количество страниц PDF"""
+    page_count, _ = PDF_BACKENDS[backend]
+    return page_count(path)
+
+
+def extract_pages(backend: str, path: str, start: int, end: int):
+    """Извлечь текст страниц PDF из диапазона [start, end)"""
+    _, extract = PDF_BACKENDS[backend]
+    return extract(path, start, end)
+
+
+def split_page_ranges(page_count: int, chunk_size: int):
+    """Разбить документ на диапазоны страниц для параллельного извлечения"""
+    chunk_size = max(chunk_size, 1)
+    return [
+        (start, min(start + chunk_size, page_count))
+        for start in range(0, page_count, chunk_size)
+    ]
+
+
+def new_section_id():
+    """Сгенерировать ID раздела, импортированного из PDF"""
+    return f"section_{uuid.uuid4().hex}"
+
+
+def new_lesson_id():
+    """Сгенерировать ID урока, импортированного из PDF"""
+    return f"content_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def renew_course_ids(result: dict, course_title: str):
+    """Копия разобранного курса с новыми ID и названием.
+
+    Нужна при повторном использовании результата из кеша, чтобы новые
+    разделы и уроки не конфликтовали с уже сохраненными.
+    """
+    return {
+        **result,
+        "title": course_title,
+        "titleForCourse": course_title,
+        "sections": [
+            {
+                **section,
+                "id": new_section_id(),
+                "content": [
+                    {**lesson, "id": new_lesson_id()} for lesson in section["content"]
+                ],
+            }
+            for section in result["sections"]
+        ],
+    }
+
+
+class CourseOutlineParser:
+    """Потоковый разбор текста PDF на разделы и уроки.
+
+    Страницы подаются по порядку через feed_pages и разбираются построчно,
+    поэтому полный текст документа никогда не хранится целиком: в памяти
+    остаются только найденные разделы и текст текущего подраздела.
+    """
+
+    def __init__(self):
+        self.page_count = 0
+        self.sections = {}  # Номер раздела -> раздел
+        self.subsections = {}  # Номер раздела -> готовые подразделы
+        self._current = None  # Подраздел, текст которого сейчас собирается
+
+    def feed_pages(self, page_texts: list):
+        """Разобрать очередную порцию страниц"""
+        for page_text in page_texts:
+            self.page_count += 1
+            for line in page_text.split("\n"):
+                self._feed_line(line)
+
+    def _feed_line(self, line: str):
+        main_match = MAIN_SECTION_LINE.match(line)
+        if main_match:
+            num, title = main_match.group(1), main_match.group(2).strip()
+            if len(title.replace(" ", "")) > 2:
+                # Генерация уникального ID для раздела
+                self.sections[num] = {
+                    "id": new_section_id(),
+                    "title": title,
+                }
+
+        sub_match = SUB_SECTION_LINE.match(line)
+        if sub_match:
+            # Текст подраздела длится до следующего заголовка подраздела
+            self._close_subsection()
+            num, title = sub_match.group(1), sub_match.group(2).strip()
+            # Фильтр: только заглавные заголовки
+            if title == title.upper():
+                self._current = {"num": num, "title": title, "lines": []}
+
+        if self._current is not None:
+            self._current["lines"].append(line)
+
+    def _close_subsection(self):
+        current, self._current = self._current, None
+        if current is None:
+            return
+        main_section_num = current["num"].split(".")[0]
+        self.subsections.setdefault(main_section_num, []).append(
+            {
+                "num": current["num"],
+                "title": current["title"],
+                "text": "\n".join(current["lines"]).strip(),
+            }
+        )
+
+    def finish(self, course_title: str):
+        """Завершить разбор и построить структуру курса"""
+        self._close_subsection()
+        print(f"Текст разобран. Количество страниц: {self.page_count}")
+        print(f"Основные разделы обработаны. Количество: {len(self.sections)}")
+
+        # Формирование результата
+        result = {
+            "title": course_title,
+            "subtitle": "Базовый курс для начинающих программистов",
+            "type": "ПРОГРАММИРОВАНИЕ",
+            "timetoendL": "С НУЛЯ",
+            "color": "#2d82b7",
+            "icon": "",
+            "icontype": "programIcon",
+            "titleForCourse": course_title,
+            "info": [],
+            "sections": [],
+        }
+
+        # Наполняем результат разделами и подразделами в порядке номеров
+        for num, sec in sorted(self.sections.items(), key=lambda x: int(x[0])):
+            section_data = {
+                "id": sec["id"],  # Используем уникальный ID для раздела
+                "name": sec["title"],
+                "content": [],
+            }
+
+            subsections = sorted(
+                self.subsections.get(num, []),
+                key=lambda x: list(map(int, x["num"].split("."))),
+            )
+            for subsection in subsections:
+                subsection_data = {
+                    "id": new_lesson_id(),
+                    "name": subsection["title"],
+                    "passing": "no",
+                    "description": subsection["text"],
+                }
+                section_data["content"].append(subsection_data)
+
+            result["sections"].append(section_data)
+
+        return result
+
+
+def save_parsed_course(db: Session, result: dict):
+    """Сохранить разобранный из PDF (или проверенный редактором) курс"""
+    # Генерируем уникальный ID для курса
+    course_id = str(uuid.uuid4())
+    write_course_trees(db, [{**result, "id": course_id}])
+    return course_id
@@ -0,0 +1,329 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, distinct, event, func, inspect, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, object_session
+
+from config import settings
+from database import Base, SessionLocal
+from models.course import Course, Lesson, Section, lesson_section
+from models.progress import CourseStats, UserCourseProgress, UserLessonProgress
+from models.user_course import user_course
+from services.course_versions import affected_course_ids
+
+# Прогресс пользователей по урокам. Отметки о прохождении записываются
+# групповыми коммитами: запросы, пришедшие, пока пишется предыдущая
+# пачка, фиксируются следующей пачкой в одной транзакции.
+#
+# Число уроков курса и счетчики пройденных уроков пересчитываются при
+# коммите, только если изменился состав уроков курса: добавлен или удален
+# курс, раздел или урок, раздел перенесен в другой курс или изменился
+# список уроков раздела. Правка названий и текстов счетчики не трогает.
+_SESSION_KEY = "progress_changed_courses"
+_queue: Optional[asyncio.Queue] = None
+_writer_task: Optional[asyncio.Task] = None
+
+
+def _lesson_courses(lesson_ids):
+    return (
+        select(lesson_section.c.lesson_id, Section.course_id)
+        .join(Section, Section.id == lesson_section.c.section_id)
+        .where(lesson_section.c.lesson_id.in_(lesson_ids))
+        .distinct()
+    )
+
+
+def apply_completions(db: Session, completions: list):
+    """Отметить уроки пройденными: completions - пары (user_id, lesson_id).
+
+    Счетчики пройденных уроков увеличиваются только для новых отметок,
+    повторное прохождение урока ничего не меняет. Возвращает множество
+    новых пар. Фиксирует транзакцию.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {"user_id": user_id, "lesson_id": lesson_id, "completed_at": now}
+        for user_id, lesson_id in dict.fromkeys(completions)
+    ]
+    created = set(
+        map(
+            tuple,
+            db.execute(
+                sqlite_insert(UserLessonProgress)
+                .on_conflict_do_nothing()
+                .returning(UserLessonProgress.user_id, UserLessonProgress.lesson_id),
+                rows,
+            ).all(),
+        )
+    )
+
+    if created:
+        courses = {}
+        for lesson_id, course_id in db.execute(
+            _lesson_courses({lesson_id for _, lesson_id in created})
+        ):
+            courses.setdefault(lesson_id, []).append(course_id)
+
+        increments = {}
+        for user_id, lesson_id in created:
+            for course_id in courses.get(lesson_id, ()):
+                key = (user_id, course_id)
+                increments[key] = increments.get(key, 0) + 1
+
+        if increments:
+            stmt = sqlite_insert(UserCourseProgress)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[
+                    UserCourseProgress.user_id,
+                    UserCourseProgress.course_id,
+                ],
+                set_={
+                    "completed_lessons": UserCourseProgress.completed_lessons
+                    + stmt.excluded.completed_lessons,
+                    "updated_at": now,
+                },
+            )
+            db.execute(
+                stmt,
+                [
+                    {
+                        "user_id": user_id,
+                        "course_id": course_id,
+                        "completed_lessons": count,
+                        "updated_at": now,
+                    }
+                    for (user_id, course_id), count in sorted(increments.items())
+                ],
+            )
+
+    db.commit()
+    return created
+
+
+def course_lessons_changed(db, course_ids=None):
+    """Отметить изменение состава уроков курсов course_ids (None - всех).
+
+    Счетчики прогресса курсов пересчитываются при коммите транзакции.
+    Нужно для массовых вставок, не вызывающих события маппера. Принимает
+    как Session, так и AsyncSession.
+    """
+    session = getattr(db, "sync_session", db)
+    changed = session.info.get(_SESSION_KEY, set())
+    if course_ids is None or changed is None:
+        session.info[_SESSION_KEY] = None
+    else:
+        session.info[_SESSION_KEY] = changed | set(course_ids)
+
+
+def refresh_course_progress(db, course_ids=None):
+    """Пересчитать число уроков и счетчики прогресса курсов course_ids (None - всех).
+
+    Вызывается в той же транзакции, что и изменение состава уроков курсов.
+    Принимает Session или Connection.
+    """
+
+    def only(column):
+        return (column.in_(course_ids),) if course_ids is not None else ()
+
+    db.execute(delete(CourseStats).where(*only(CourseStats.course_id)))
+    db.execute(
+        sqlite_insert(CourseStats).from_select(
+            [CourseStats.course_id, CourseStats.lesson_count],
+            select(Course.id, func.count(distinct(lesson_section.c.lesson_id)))
+            .outerjoin(Section, Section.course_id == Course.id)
+            .outerjoin(lesson_section, lesson_section.c.section_id == Section.id)
+            .where(*only(Course.id))
+            .group_by(Course.id),
+        )
+    )
+
+    db.execute(delete(UserCourseProgress).where(*only(UserCourseProgress.course_id)))
+    db.execute(
+        sqlite_insert(UserCourseProgress).from_select(
+            [
+                UserCourseProgress.user_id,
+                UserCourseProgress.course_id,
+                UserCourseProgress.completed_lessons,
+                UserCourseProgress.updated_at,
+            ],
+            select(
+                UserLessonProgress.user_id,
+                Section.course_id,
+                func.count(distinct(UserLessonProgress.lesson_id)),
+                func.max(UserLessonProgress.completed_at),
+            )
+            .join(lesson_section, lesson_section.c.section_id == Section.id)
+            .join(
+                UserLessonProgress,
+                UserLessonProgress.lesson_id == lesson_section.c.lesson_id,
+            )
+            .where(*only(Section.course_id))
+            .group_by(UserLessonProgress.user_id, Section.course_id),
+        )
+    )
+
+
+def get_user_progress(db: Session, user_id: int):
+    """Прогресс пользователя по всем курсам, на которые он записан.
+
+    Один запрос по первичным ключам user_courses, user_course_progress и
+    course_stats, без подсчета уроков.
+    """
+    rows = db.execute(
+        select(
+            user_course.c.course_id,
+            Course.title,
+            func.coalesce(UserCourseProgress.completed_lessons, 0),
+            func.coalesce(CourseStats.lesson_count, 0),
+        )
+        .join(Course, Course.id == user_course.c.course_id)
+        .outerjoin(
+            UserCourseProgress,
+            (UserCourseProgress.user_id == user_course.c.user_id)
+            & (UserCourseProgress.course_id == user_course.c.course_id),
+        )
+        .outerjoin(CourseStats, CourseStats.course_id == user_course.c.course_id)
+        .where(user_course.c.user_id == user_id)
+        .order_by(Course.title, Course.id)
+    ).all()
+    return [
+        {
+            "course_id": course_id,
+            "title": title,
+            "completed_lessons": completed,
+            "total_lessons": total,
+            "percent": round(100 * min(completed, total) / total) if total else 0,
+        }
+        for course_id, title, completed, total in rows
+    ]
+
+
+def get_completed_lessons(db: Session, user_id: int, course_id: str):
+    """ID уроков курса, пройденных пользователем"""
+    return list(
+        db.execute(
+            select(UserLessonProgress.lesson_id)
+            .join(
+                lesson_section,
+                lesson_section.c.lesson_id == UserLessonProgress.lesson_id,
+            )
+            .join(Section, Section.id == lesson_section.c.section_id)
+            .where(
+                UserLessonProgress.user_id == user_id,
+                Section.course_id == course_id,
+            )
+            .distinct()
+            .order_by(UserLessonProgress.lesson_id)
+        ).scalars()
+    )
+
+
+def _apply_batch(completions: list):
+    db = SessionLocal()
+    try:
+        return apply_completions(db, completions)
+    finally:
+        db.close()
+
+
+async def _writer_loop():
+    stopping = False
+    while not stopping:
+        batch = [await _queue.get()]
+        # Все, что накопилось за время записи предыдущей пачки
+        while len(batch) < settings.PROGRESS_BATCH_MAX and not _queue.empty():
+            batch.append(_queue.get_nowait())
+        if None in batch:
+            stopping = True
+            batch = [item for item in batch if item is not None]
+        if not batch:
+            continue
+
+        try:
+            created = await run_in_threadpool(
+                _apply_batch, [(user_id, lesson_id) for user_id, lesson_id, _ in batch]
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+        for user_id, lesson_id, future in batch:
+            if not future.done():
+                future.set_result((user_id, lesson_id) in created)
+
+
+async def record_completion(user_id: int, lesson_id: str):
+    """Отметить урок пройденным и дождаться коммита пачки с этой отметкой.
+
+    Возвращает False, если урок уже был пройден пользователем.
+    """
+    if _writer_task is None:
+        created = await run_in_threadpool(_apply_batch, [(user_id, lesson_id)])
+        return (user_id, lesson_id) in created
+    future = asyncio.get_running_loop().create_future()
+    await _queue.put((user_id, lesson_id, future))
+    return await future
+
+
+def start_progress_writer():
+    """Запустить групповую запись прогресса"""
+    global _queue, _writer_task
+    _queue = asyncio.Queue()
+    _writer_task = asyncio.create_task(_writer_loop())
+
+
+async def stop_progress_writer():
+    """Записать оставшиеся отметки и остановить запись прогресса"""
+    global _writer_task
+    if _writer_task is not None:
+        await _queue.put(None)
+        await _writer_task
+        _writer_task = None
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _backfill_course_stats(target, connection, **kw):
+    # Число уроков курсов, созданных до появления course_stats
+    if connection.scalar(select(CourseStats.course_id).limit(1)) is None:
+        refresh_course_progress(connection)
+
+
+@event.listens_for(Session, "before_commit")
+def _refresh_changed_courses(session: Session):
+    # События маппера срабатывают при сбросе, поэтому сбрасываем до пересчета
+    session.flush()
+    if _SESSION_KEY in session.info:
+        refresh_course_progress(session, session.info.pop(_SESSION_KEY))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_courses(session: Session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def _track_membership(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        course_lessons_changed(session, affected_course_ids(connection, target))
+
+
+def _track_membership_update(mapper, connection, target):
+    # Раздел: перенос в другой курс или новый список уроков.
+    # Урок: добавлен в разделы или убран из них
+    if isinstance(target, Section):
+        attrs = (inspect(target).attrs.course_id, inspect(target).attrs.content)
+    else:
+        attrs = (inspect(target).attrs.sections,)
+    if any(attr.history.has_changes() for attr in attrs):
+        _track_membership(mapper, connection, target)
+
+
+for _model in (Course, Section, Lesson):
+    event.listen(_model, "after_insert", _track_membership)
+    event.listen(_model, "after_delete", _track_membership)
+for _model in (Section, Lesson):
+    event.listen(_model, "after_update", _track_membership_update)
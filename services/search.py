@@ -0,0 +1,120 @@
+import re
+from typing import Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from models.course import Section, lesson_section
+from models.search import SEARCH_INDEX, SEARCH_SOURCES
+from services.pagination import encode_cursor
+
+# Вес совпадения в заголовке относительно совпадения в тексте (bm25)
+TITLE_WEIGHT = 10.0
+# Длина фрагмента текста в словах
+SNIPPET_TOKENS = 16
+
+_SCORE = f"bm25({SEARCH_INDEX}, {TITLE_WEIGHT}, 1.0)"
+
+
+def match_expression(query: str):
+    """Преобразовать пользовательский запрос в выражение FTS5 MATCH.
+
+    Каждое слово ищется как префикс, все слова должны встретиться в
+    документе. Синтаксис FTS5 (кавычки, NEAR, OR) из запроса не передается.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        raise ValueError("Пустой поисковый запрос")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _locate(db: Session, rows: list):
+    """Курс и раздел для найденных разделов и уроков"""
+    section_ids = [row.ref_id for row in rows if row.kind == "section"]
+    lesson_ids = [row.ref_id for row in rows if row.kind == "lesson"]
+    courses, sections = {}, {}
+    if section_ids:
+        courses.update(
+            db.execute(
+                select(Section.id, Section.course_id).where(Section.id.in_(section_ids))
+            ).all()
+        )
+    if lesson_ids:
+        # Урок может входить в несколько разделов, берется первый
+        for lesson_id, section_id, course_id in db.execute(
+            select(lesson_section.c.lesson_id, Section.id, Section.course_id)
+            .join(Section, Section.id == lesson_section.c.section_id)
+            .where(lesson_section.c.lesson_id.in_(lesson_ids))
+            .order_by(lesson_section.c.lesson_id, Section.id)
+        ):
+            sections.setdefault(lesson_id, (section_id, course_id))
+    return courses, sections
+
+
+def search(
+    db: Session,
+    query: str,
+    kind: Optional[str] = None,
+    after: Optional[list] = None,
+    limit: int = 20,
+):
+    """Найти курсы, разделы и уроки, упорядочив по релевантности (bm25).
+
+    after - ключ (релевантность, ID документа) последнего результата
+    предыдущей страницы. Возвращает результаты и курсор следующей страницы.
+    """
+    if kind is not None and kind not in SEARCH_SOURCES:
+        raise ValueError(f"Неизвестный тип: {kind}")
+
+    conditions = [f"{SEARCH_INDEX} MATCH :match"]
+    params = {"match": match_expression(query), "limit": limit + 1}
+    if kind is not None:
+        conditions.append("d.kind = :kind")
+        params["kind"] = kind
+    if after is not None:
+        conditions.append(
+            f"({_SCORE} > :score OR ({_SCORE} = :score AND d.id > :doc_id))"
+        )
+        params["score"], params["doc_id"] = after
+
+    rows = db.execute(
+        text(
+            f"SELECT d.id, d.kind, d.ref_id, {_SCORE} AS score, "
+            f"{SEARCH_INDEX}.title, "
+            f"snippet({SEARCH_INDEX}, -1, '<mark>', '</mark>', '…', "
+            f"{SNIPPET_TOKENS}) AS snippet "
+            f"FROM {SEARCH_INDEX} JOIN search_documents d "
+            f"ON d.id = {SEARCH_INDEX}.rowid "
+            f"WHERE {' AND '.join(conditions)} "
+            "ORDER BY score, d.id LIMIT :limit"
+        ),
+        params,
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].id)
+
+    courses, sections = _locate(db, rows)
+    results = []
+    for row in rows:
+        result = {
+            "kind": row.kind,
+            "id": row.ref_id,
+            "title": row.title,
+            "snippet": row.snippet or None,
+            "course_id": None,
+            "section_id": None,
+        }
+        if row.kind == "course":
+            result["course_id"] = row.ref_id
+        elif row.kind == "section":
+            result["course_id"] = courses.get(row.ref_id)
+            result["section_id"] = row.ref_id
+        else:
+            result["section_id"], result["course_id"] = sections.get(
+                row.ref_id, (None, None)
+            )
+        results.append(result)
+    return results, next_cursor
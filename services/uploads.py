@@ -0,0 +1,313 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+
+# Размер блока при копировании загрузок на диск
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+UPLOAD_SPOOL_DIR = Path(settings.UPLOAD_SPOOL_DIR)
+UPLOAD_SPOOL_DIR.mkdir(exist_ok=True, parents=True)
+
+
+def _copy_to_disk(source, suffix: str):
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=UPLOAD_SPOOL_DIR)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as target:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                target.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, size, digest.hexdigest()
+
+
+async def spool_upload(file: UploadFile, suffix: str = ""):
+    """Скопировать загруженный файл во временный файл на диске по блокам.
+
+    Возвращает путь, размер и SHA-256 содержимого. Файл целиком в память
+    не читается; удалять временный файл должен вызывающий код.
+    """
+    await file.seek(0)
+    return await run_in_threadpool(_copy_to_disk, file.file, suffix)
+
+
+def remove_spooled(path: str):
+    """Удалить временный файл загрузки"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Докачиваемые загрузки по частям. Сессия загрузки - каталог в
+# RESUMABLE_UPLOAD_DIR: meta.json с описанием файла, data - файл заранее
+# известного размера, в который части пишутся по своим смещениям, и
+# parts/<номер> - отметки о принятых частях с их SHA-256. Все хранится на
+# диске, поэтому части можно отправлять в любой процесс-обработчик.
+UPLOAD_UPLOADING = "uploading"
+UPLOAD_COMPLETED = "completed"
+
+RESUMABLE_UPLOAD_DIR = Path(settings.RESUMABLE_UPLOAD_DIR)
+RESUMABLE_UPLOAD_DIR.mkdir(exist_ok=True, parents=True)
+
+
+class UploadSessionError(Exception):
+    """Ошибка загрузки по частям с HTTP-статусом для ответа"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def _session_dir(upload_id: str):
+    if not upload_id.isalnum():
+        raise UploadSessionError(404, "Загрузка не найдена")
+    return RESUMABLE_UPLOAD_DIR / upload_id
+
+
+def _store_meta(meta: dict):
+    path = _session_dir(meta["upload_id"]) / "meta.json"
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _load_meta(upload_id: str):
+    try:
+        with (_session_dir(upload_id) / "meta.json").open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        raise UploadSessionError(404, "Загрузка не найдена")
+
+
+def _received_parts(upload_id: str):
+    parts_dir = _session_dir(upload_id) / "parts"
+    return {int(path.name) for path in parts_dir.iterdir() if path.name.isdigit()}
+
+
+def _prune_sessions():
+    """Удалить сессии, в которые давно ничего не записывали"""
+    deadline = time.time() - settings.RESUMABLE_TTL_SECONDS
+    for session_dir in RESUMABLE_UPLOAD_DIR.iterdir():
+        try:
+            if (session_dir / "data").stat().st_mtime < deadline:
+                shutil.rmtree(session_dir, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+def upload_status(meta: dict):
+    """Состояние загрузки для ответа API: номера недостающих частей"""
+    status = dict(meta)
+    if meta["status"] == UPLOAD_UPLOADING:
+        received = _received_parts(meta["upload_id"])
+        status["missing_chunks"] = [
+            index for index in range(meta["chunk_count"]) if index not in received
+        ]
+    return status
+
+
+def create_upload_session(
+    filename: str,
+    size: int,
+    content_type: Optional[str] = None,
+    sha256: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+):
+    """Создать сессию загрузки файла размером size, разбитого на части.
+
+    Файл данных создается сразу нужного размера (разреженным), части
+    записываются в него по смещению номер * chunk_size в любом порядке.
+    """
+    if size > settings.RESUMABLE_MAX_SIZE:
+        raise UploadSessionError(413, "Размер загружаемого файла слишком велик")
+    chunk_size = chunk_size or settings.RESUMABLE_CHUNK_SIZE
+    if settings.MAX_UPLOAD_SIZE:
+        chunk_size = min(chunk_size, settings.MAX_UPLOAD_SIZE)
+
+    _prune_sessions()
+    upload_id = uuid.uuid4().hex
+    session_dir = _session_dir(upload_id)
+    (session_dir / "parts").mkdir(parents=True)
+    with (session_dir / "data").open("wb") as f:
+        f.truncate(size)
+
+    meta = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "chunk_size": chunk_size,
+        "chunk_count": max(1, -(-size // chunk_size)),
+        "sha256": sha256.lower() if sha256 else None,
+        "status": UPLOAD_UPLOADING,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    _store_meta(meta)
+    return upload_status(meta)
+
+
+async def write_upload_chunk(
+    upload_id: str,
+    index: int,
+    stream: AsyncIterator[bytes],
+    chunk_sha256: Optional[str] = None,
+):
+    """Записать часть index из потока тела запроса прямо в файл данных.
+
+    Часть пишется блоками по UPLOAD_CHUNK_SIZE, в памяти не собирается.
+    Повторная отправка части перезаписывает ее. Если передан
+    chunk_sha256, содержимое части сверяется с ним.
+    """
+    meta = await run_in_threadpool(_load_meta, upload_id)
+    if meta["status"] != UPLOAD_UPLOADING:
+        raise UploadSessionError(409, "Загрузка уже завершена")
+    if not 0 <= index < meta["chunk_count"]:
+        raise UploadSessionError(400, "Некорректный номер части")
+
+    offset = index * meta["chunk_size"]
+    expected = min(meta["chunk_size"], meta["size"] - offset)
+    # Пока часть пишется, она не считается принятой
+    part_path = _session_dir(upload_id) / "parts" / str(index)
+    part_path.unlink(missing_ok=True)
+
+    digest = hashlib.sha256()
+    written = 0
+    buffer = bytearray()
+    fd = os.open(_session_dir(upload_id) / "data", os.O_WRONLY)
+    try:
+        async for piece in stream:
+            if written + len(buffer) + len(piece) > expected:
+                raise UploadSessionError(400, f"Размер части должен быть {expected}")
+            digest.update(piece)
+            buffer += piece
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                await run_in_threadpool(os.pwrite, fd, bytes(buffer), offset + written)
+                written += len(buffer)
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(os.pwrite, fd, bytes(buffer), offset + written)
+            written += len(buffer)
+    finally:
+        os.close(fd)
+
+    if written != expected:
+        raise UploadSessionError(400, f"Размер части должен быть {expected}")
+    if chunk_sha256 and chunk_sha256.lower() != digest.hexdigest():
+        raise UploadSessionError(422, "Контрольная сумма части не совпадает")
+
+    part_path.write_text(digest.hexdigest())
+    return await run_in_threadpool(upload_status, meta)
+
+
+def _file_sha256(path: Path):
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def finalize_upload(upload_id: str, sha256: Optional[str] = None):
+    """Проверить, что получены все части, и сверить SHA-256 файла.
+
+    Контрольная сумма передается при создании сессии или здесь. При
+    несовпадении сессия остается открытой для повторной отправки частей.
+    """
+    meta = _load_meta(upload_id)
+    if meta["status"] == UPLOAD_COMPLETED:
+        return upload_status(meta)
+
+    missing = set(range(meta["chunk_count"])) - _received_parts(upload_id)
+    if missing:
+        raise UploadSessionError(
+            409, f"Получены не все части, недостает: {len(missing)}"
+        )
+    expected = (sha256 or meta["sha256"] or "").lower()
+    if not expected:
+        raise UploadSessionError(400, "Нужно передать SHA-256 файла")
+    if _file_sha256(_session_dir(upload_id) / "data") != expected:
+        raise UploadSessionError(422, "Контрольная сумма файла не совпадает")
+
+    meta["sha256"] = expected
+    meta["status"] = UPLOAD_COMPLETED
+    _store_meta(meta)
+    shutil.rmtree(_session_dir(upload_id) / "parts", ignore_errors=True)
+    return upload_status(meta)
+
+
+def get_upload(upload_id: str):
+    """Состояние загрузки: для возобновления - номера недостающих частей"""
+    return upload_status(_load_meta(upload_id))
+
+
+def get_completed_upload(upload_id: str):
+    """Описание завершенной загрузки; UploadSessionError, если ее нет"""
+    meta = _load_meta(upload_id)
+    if meta["status"] != UPLOAD_COMPLETED:
+        raise UploadSessionError(409, "Загрузка еще не завершена")
+    return meta
+
+
+def consume_upload(upload_id: str, target: Path):
+    """Переместить файл завершенной загрузки в target и закрыть сессию.
+
+    Сессия сначала атомарно переименовывается, поэтому один файл не
+    может быть забран двумя запросами одновременно.
+    """
+    meta = get_completed_upload(upload_id)
+    session_dir = _session_dir(upload_id)
+    claimed_dir = session_dir.with_name(f"{upload_id}.{os.getpid()}.{uuid.uuid4().hex}")
+    try:
+        os.rename(session_dir, claimed_dir)
+    except FileNotFoundError:
+        raise UploadSessionError(404, "Загрузка не найдена")
+    try:
+        shutil.move(claimed_dir / "data", target)
+    finally:
+        shutil.rmtree(claimed_dir, ignore_errors=True)
+    return meta
+
+
+def spool_completed_upload(upload_id: str, suffix: str = ""):
+    """Забрать завершенную загрузку во временный файл, как spool_upload.
+
+    Возвращает путь, размер и SHA-256 содержимого.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=UPLOAD_SPOOL_DIR)
+    os.close(fd)
+    try:
+        meta = consume_upload(upload_id, Path(path))
+    except BaseException:
+        remove_spooled(path)
+        raise
+    return path, meta["size"], meta["sha256"]
+
+
+def abort_upload(upload_id: str):
+    """Удалить сессию загрузки вместе с принятыми частями"""
+    session_dir = _session_dir(upload_id)
+    if not session_dir.exists():
+        raise UploadSessionError(404, "Загрузка не найдена")
+    shutil.rmtree(session_dir, ignore_errors=True)
@@ -0,0 +1,30 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Тесты работают с отдельной базой во временной директории. Путь задается
+# до импорта config, поэтому база разработчика не затрагивается.
+_TMP_DIR = Path(tempfile.mkdtemp(prefix="college-tests-"))
+os.environ["DATABASE_PATH"] = str(_TMP_DIR / "college.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from database import SessionLocal  # noqa: E402
+from main import app  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    # Без контекстного менеджера: фоновые задачи приложения не запускаются
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,61 @@
+import uuid
+
+from sqlalchemy import update
+
+from database import engine
+from models.course import Course, CourseVersion
+from schemas.course import CourseCreate
+from services.course import create_course
+
+
+def _course():
+    return CourseCreate(
+        id=str(uuid.uuid4()),
+        title="Старое название",
+        subtitle="",
+        type="",
+        timetoendL="",
+        color="",
+        icon="",
+        icontype="",
+        titleForCourse="",
+    )
+
+
+def _update_from_other_worker(course_id: str):
+    # Изменение другим процессом: версия в базе растет, а локальный кеш
+    # этого процесса не сбрасывается до опроса поколений
+    with engine.begin() as conn:
+        conn.execute(
+            update(Course).where(Course.id == course_id).values(title="Новое название")
+        )
+        conn.execute(
+            update(CourseVersion)
+            .where(CourseVersion.course_id == course_id)
+            .values(version=CourseVersion.version + 1)
+        )
+
+
+def test_course_cached_under_old_version_is_reloaded(client, db):
+    course = create_course(db, _course())
+    first = client.get(f"/api/courses/{course.id}")
+    assert first.json()["title"] == "Старое название"
+
+    _update_from_other_worker(course.id)
+
+    second = client.get(f"/api/courses/{course.id}")
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json()["title"] == "Новое название"
+
+
+def test_catalog_page_cached_under_old_version_is_reloaded(client, db):
+    course = create_course(db, _course())
+    url = "/api/courses/?fields=title&limit=1000"
+    first = client.get(url)
+    assert {"id": course.id, "title": "Старое название"} in first.json()
+
+    _update_from_other_worker(course.id)
+
+    second = client.get(url)
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert {"id": course.id, "title": "Новое название"} in second.json()
@@ -0,0 +1,97 @@
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import event, select
+
+from database import engine
+from models.course import Course, Lesson, Section
+from models.progress import CourseStats, UserCourseProgress
+from models.user import User
+from schemas.course import CourseCreate
+from services.course import create_course
+from services.progress import apply_completions
+
+
+@contextmanager
+def progress_recounts():
+    recounts = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if statement.startswith("DELETE FROM user_course_progress"):
+            recounts.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield recounts
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _lesson():
+    return {"id": str(uuid.uuid4()), "name": "Урок", "passing": "no"}
+
+
+def _setup(db):
+    section_id = str(uuid.uuid4())
+    course = create_course(
+        db,
+        CourseCreate(
+            id=str(uuid.uuid4()),
+            title="Курс",
+            subtitle="",
+            type="",
+            timetoendL="",
+            color="",
+            icon="",
+            icontype="",
+            titleForCourse="",
+            sections=[{"id": section_id, "name": "Раздел", "content": [_lesson()]}],
+        ),
+    )
+    user = User(login=uuid.uuid4().hex, email=f"{uuid.uuid4().hex}@example.com")
+    db.add(user)
+    db.commit()
+    lesson_id = course.sections[0].content[0].id
+    apply_completions(db, [(user.id, lesson_id)])
+    return course.id, section_id, lesson_id, user.id
+
+
+def _counters(db, course_id, user_id):
+    lessons = db.scalar(
+        select(CourseStats.lesson_count).where(CourseStats.course_id == course_id)
+    )
+    completed = db.scalar(
+        select(UserCourseProgress.completed_lessons).where(
+            UserCourseProgress.course_id == course_id,
+            UserCourseProgress.user_id == user_id,
+        )
+    )
+    return lessons, completed
+
+
+def test_text_edits_do_not_recount_progress(db):
+    course_id, section_id, lesson_id, user_id = _setup(db)
+
+    with progress_recounts() as recounts:
+        db.get(Course, course_id).title = "Новое название"
+        db.get(Section, section_id).name = "Новый раздел"
+        db.get(Lesson, lesson_id).description = "Новый текст"
+        db.commit()
+
+    assert recounts == []
+    assert _counters(db, course_id, user_id) == (1, 1)
+
+
+def test_lesson_membership_changes_recount_progress(db):
+    course_id, section_id, lesson_id, user_id = _setup(db)
+    section = db.get(Section, section_id)
+
+    with progress_recounts() as recounts:
+        section.content.append(Lesson(**_lesson()))
+        db.commit()
+    assert len(recounts) == 1
+    assert _counters(db, course_id, user_id) == (2, 1)
+
+    section.content.remove(db.get(Lesson, lesson_id))
+    db.commit()
+    assert _counters(db, course_id, user_id) == (1, None)
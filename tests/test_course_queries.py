@@ -0,0 +1,99 @@
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from database import async_engine
+from schemas.course import CourseCreate
+from services import catalog_cache
+from services.course import create_course, write_course_trees
+
+# Число запросов на чтение каталога и дерева курса не должно зависеть
+# от количества курсов, разделов и уроков (нет N+1)
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(
+        async_engine.sync_engine, "before_cursor_execute", before_cursor_execute
+    )
+    try:
+        yield statements
+    finally:
+        event.remove(
+            async_engine.sync_engine, "before_cursor_execute", before_cursor_execute
+        )
+
+
+def _course_tree(sections: int, lessons: int):
+    return {
+        "id": str(uuid.uuid4()),
+        "title": f"Курс {uuid.uuid4().hex[:8]}",
+        "subtitle": "",
+        "type": "",
+        "timetoendL": "",
+        "color": "",
+        "icon": "",
+        "icontype": "",
+        "titleForCourse": "",
+        "info": [{"id": str(uuid.uuid4()), "title": "О курсе", "subtitle": "Описание"}],
+        "sections": [
+            {
+                "id": str(uuid.uuid4()),
+                "name": f"Раздел {s}",
+                "content": [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "name": f"Урок {l}",
+                        "passing": "false",
+                        "description": "Текст урока",
+                    }
+                    for l in range(lessons)
+                ],
+            }
+            for s in range(sections)
+        ],
+    }
+
+
+def _get(client, url: str):
+    # Кеш каталога сбрасывается, чтобы каждый раз считались запросы к базе
+    catalog_cache._clear()
+    with count_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return response, len(statements)
+
+
+@pytest.mark.parametrize("sections,lessons", [(1, 1), (10, 20)])
+def test_course_detail_query_count_is_constant(client, db, sections, lessons):
+    course = create_course(db, CourseCreate(**_course_tree(sections, lessons)))
+
+    response, queries = _get(client, f"/api/courses/{course.id}")
+
+    body = response.json()
+    assert len(body["sections"]) == sections
+    assert all(len(section["content"]) == lessons for section in body["sections"])
+    # Версия курса, курс, info, разделы и уроки разделов
+    assert queries == 5
+
+
+def test_catalog_with_lessons_query_count_is_constant(client, db):
+    counts, sizes = [], []
+    for added in (3, 30):
+        write_course_trees(db, [_course_tree(3, 5) for _ in range(added)])
+
+        response, queries = _get(client, "/api/courses/?include=lessons&limit=1000")
+
+        counts.append(queries)
+        sizes.append(len(response.json()))
+
+    assert sizes[1] == sizes[0] + 30
+    # Версия каталога, курсы, разделы и уроки разделов
+    assert counts == [4, 4]
@@ -0,0 +1,98 @@
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from config import settings
+from models.email_outbox import EmailOutbox
+from services import email_outbox
+from services.email_outbox import EMAIL_FAILED, EMAIL_PENDING, EMAIL_SENT
+
+
+class RecordingHandler:
+    """SMTP-сервер в процессе теста: запоминает письма и соединения"""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+        self.reject = False
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        if self.reject:
+            return "451 Временная ошибка"
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(monkeypatch, db):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    monkeypatch.setattr(settings, "SMTP_HOST", controller.hostname)
+    monkeypatch.setattr(settings, "SMTP_PORT", controller.port)
+    monkeypatch.setattr(settings, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(settings, "SMTP_USER", "")
+    monkeypatch.setattr(settings, "EMAIL_SENDER", "college@example.com")
+    db.query(EmailOutbox).delete()
+    db.commit()
+    try:
+        yield handler
+    finally:
+        email_outbox._close_smtp()
+        controller.stop()
+
+
+def _statuses(db):
+    db.expire_all()
+    return [
+        (message.status, message.attempts)
+        for message in db.query(EmailOutbox).order_by(EmailOutbox.id)
+    ]
+
+
+def test_enqueue_returns_without_sending(smtp, db):
+    email_outbox.enqueue_email(db, "student@example.com", "Тема", "Текст")
+
+    assert smtp.messages == []
+    assert _statuses(db) == [(EMAIL_PENDING, 0)]
+
+
+def test_batch_is_sent_over_one_connection(smtp, db):
+    for number in range(3):
+        email_outbox.enqueue_email(db, f"student{number}@example.com", "Тема", "Текст")
+
+    assert email_outbox._process_batch() is True
+
+    assert [message.rcpt_tos for message in smtp.messages] == [
+        [f"student{number}@example.com"] for number in range(3)
+    ]
+    assert len(smtp.sessions) == 1
+    assert _statuses(db) == [(EMAIL_SENT, 0)] * 3
+    # Очередь пуста
+    assert email_outbox._process_batch() is False
+
+
+def test_failure_is_retried_then_marked_failed(smtp, db, monkeypatch):
+    monkeypatch.setattr(settings, "EMAIL_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "EMAIL_RETRY_SECONDS", 0)
+    smtp.reject = True
+    email_outbox.enqueue_email(db, "student@example.com", "Тема", "Текст")
+
+    email_outbox._process_batch()
+    assert _statuses(db) == [(EMAIL_PENDING, 1)]
+    email_outbox._process_batch()
+    assert _statuses(db) == [(EMAIL_PENDING, 2)]
+    email_outbox._process_batch()
+    assert _statuses(db) == [(EMAIL_FAILED, 3)]
+
+    # Каждая попытка дошла до сервера, после failed попыток больше нет
+    assert len(smtp.sessions) == 3
+    assert email_outbox._process_batch() is False
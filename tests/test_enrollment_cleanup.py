@@ -0,0 +1,59 @@
+import uuid
+
+from sqlalchemy import func, select
+
+from models.user import User
+from models.user_course import user_course
+from schemas.course import CourseCreate
+from services.course import create_course
+from services.enrollment import enroll_users
+
+
+def _enrolled(db, **where):
+    query = select(func.count()).select_from(user_course)
+    for column, value in where.items():
+        query = query.where(user_course.c[column] == value)
+    return db.scalar(query)
+
+
+def _setup(db):
+    course = create_course(
+        db,
+        CourseCreate(
+            id=str(uuid.uuid4()),
+            title="Курс",
+            subtitle="",
+            type="",
+            timetoendL="",
+            color="",
+            icon="",
+            icontype="",
+            titleForCourse="",
+        ),
+    )
+    users = [
+        User(login=uuid.uuid4().hex, email=f"{uuid.uuid4().hex}@example.com")
+        for _ in range(2)
+    ]
+    db.add_all(users)
+    db.commit()
+    user_ids = [user.id for user in users]
+    enroll_users(db, course.id, user_ids)
+    return course.id, user_ids
+
+
+def test_delete_user_removes_enrollments(client, db):
+    course_id, (user_id, other_id) = _setup(db)
+
+    assert client.delete(f"/api/users/{user_id}").status_code == 200
+
+    assert _enrolled(db, user_id=user_id) == 0
+    assert _enrolled(db, user_id=other_id) == 1
+
+
+def test_delete_course_removes_enrollments(client, db):
+    course_id, _ = _setup(db)
+
+    assert client.delete(f"/api/courses/{course_id}").status_code == 200
+
+    assert _enrolled(db, course_id=course_id) == 0
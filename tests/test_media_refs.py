@@ -0,0 +1,65 @@
+import uuid
+
+from models.course import Course
+from models.image import MediaBlob
+from schemas.course import CourseCreate
+from services.course import create_course
+from services.images import remove_image_variants, replace_image_variants
+from services.media import MEDIA_DIR, collect_garbage, media_path, media_url
+
+
+def _variant():
+    sha256 = uuid.uuid4().hex * 2
+    return {
+        "width": 64,
+        "height": 64,
+        "format": "webp",
+        "url": media_url(sha256, ".webp"),
+        "sha256": sha256,
+        "size": 1,
+    }
+
+
+def _ref_count(db, sha256):
+    db.expire_all()
+    return db.get(MediaBlob, sha256).ref_count
+
+
+def test_media_path_is_inside_media_dir():
+    url = media_url("ab" * 32, ".webp")
+
+    assert media_path(url) == MEDIA_DIR / "ab" / f"{'ab' * 32}.webp"
+    assert media_path(f"/{url}") == media_path(url)
+
+
+def test_course_icon_keeps_foreign_variant_alive(db):
+    variant = _variant()
+    owner_id = uuid.uuid4().hex
+    replace_image_variants(db, "user", owner_id, [variant])
+    db.commit()
+    # Иконка курса указывает на вариант аватара, записанный через API курса
+    course = create_course(
+        db,
+        CourseCreate(
+            id=str(uuid.uuid4()),
+            title="Курс",
+            subtitle="",
+            type="",
+            timetoendL="",
+            color="",
+            icon=f"/{variant['url']}",
+            icontype="",
+            titleForCourse="",
+        ),
+    )
+    released = remove_image_variants(db, "user", owner_id)
+    db.commit()
+
+    assert _ref_count(db, variant["sha256"]) == 1
+    assert collect_garbage(released) == 0
+
+    db.get(Course, course.id).icon = ""
+    db.commit()
+
+    assert _ref_count(db, variant["sha256"]) == 0
+    assert collect_garbage(released) == 1
@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from services import pdf_jobs
+
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_jobs, "PDF_JOBS_DIR", tmp_path)
+    return tmp_path
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def _write_claim(jobs_dir, job_id, pid, created):
+    (jobs_dir / f"{job_id}.commit").write_text(
+        json.dumps({"pid": pid, "created": created})
+    )
+
+
+def test_live_claim_is_not_taken(jobs_dir):
+    assert pdf_jobs._claim_commit("job")
+    assert not pdf_jobs._claim_commit("job")
+
+
+def test_claim_of_dead_process_is_taken(jobs_dir):
+    _write_claim(jobs_dir, "job", _dead_pid(), time.time())
+
+    assert pdf_jobs._claim_commit("job")
+    claim = json.loads((jobs_dir / "job.commit").read_text())
+    assert claim["pid"] == os.getpid()
+    assert [path.name for path in jobs_dir.iterdir()] == ["job.commit"]
+
+
+def test_expired_claim_is_taken(jobs_dir):
+    created = time.time() - pdf_jobs.settings.PDF_COMMIT_CLAIM_TIMEOUT_SECONDS - 1
+    _write_claim(jobs_dir, "job", os.getpid(), created)
+
+    assert pdf_jobs._claim_commit("job")
@@ -0,0 +1,30 @@
+import time
+
+from schemas.user import UserOut
+from services import auth
+
+
+def _principal(user_id: int):
+    return UserOut(id=user_id, login=f"user{user_id}", email=f"{user_id}@example.com")
+
+
+def test_put_after_clear_is_skipped():
+    auth._clear_principal_cache()
+    # Пользователь прочитан до очистки кеша, а записан после нее
+    epoch = auth._cache_epoch()
+    auth._clear_principal_cache({"1"})
+    auth._cache_put("token", _principal(1), time.time() + 60, epoch)
+
+    assert auth._cache_get("token") is None
+
+
+def test_invalidation_drops_only_user_tokens():
+    auth._clear_principal_cache()
+    expires = time.time() + 60
+    auth._cache_put("first", _principal(1), expires, auth._cache_epoch())
+    auth._cache_put("second", _principal(2), expires, auth._cache_epoch())
+
+    auth._clear_principal_cache({"1"})
+
+    assert auth._cache_get("first") is None
+    assert auth._cache_get("second") == _principal(2)